@@ -7,23 +7,28 @@ content, chunks into semantically coherent segments, embeds with sentence-transf
 and stores in FAISS for semantic search.
 
 Usage:
-    python build_ask_pastor_bob_db.py --limit 50    # test run on 50 files
+    python build_ask_pastor_bob_db.py --limit 50 --index-type flat   # test run on 50 files
     python build_ask_pastor_bob_db.py                # full run
     python build_ask_pastor_bob_db.py --query "How do I share my faith?"
 """
 
 import argparse
 import hashlib
-import json
 import logging
+import multiprocessing
 import os
+import pickle
 import re
 import sys
 import time
+from array import array
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Optional
 
 import numpy as np
+import orjson
 from tqdm import tqdm
 
 logging.basicConfig(
@@ -42,9 +47,27 @@ VDB_PATH = "./ask-pastor-bob-vdb"
 COLLECTION_NAME = "sermon_chunks"
 EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 CHUNK_MIN_WORDS = 30
-CHUNK_MAX_WORDS = 160
+CHUNK_MAX_WORDS = 160  # overlap included; leaves margin inside MiniLM's 256-token window
 CHUNK_TARGET_WORDS = 120
-CHECKPOINT_EVERY = 50
+CHUNK_OVERLAP_WORDS = 30
+EMBED_MAX_SEQ_LENGTH = 256
+ONNX_MODEL_DIR = "./all-MiniLM-L6-v2-onnx-int8"
+ONNX_QUANTIZED_FILE = "onnx/model_qint8_avx512_vnni.onnx"
+JSON3_MIN_BYTES = 8 * 1024  # smaller caption files never yield a chunk
+CHECKPOINT_EVERY = 200  # sermons per batched encode + FAISS add + save
+INDEX_TYPES = ("flat", "hnsw", "ivf")
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+IVF_PQ_FACTORY = "IVF1024,PQ48"
+IVF_MIN_VECTORS = 50_000
+IVF_TRAIN_SAMPLE = 100_000
+IVF_NPROBE = 16
+MMAP_THRESHOLD_BYTES = 256 * 1024 * 1024
+
+# Metadata is stored column-wise; repeated strings are interned into a shared pool
+META_STR_COLUMNS = ("video_id", "youtube_url", "title", "source_file")
+META_INT_COLUMNS = ("start_sec", "end_sec", "word_count")
 
 WORSHIP_KEYWORDS = re.compile(
     r"\b(welcome|good morning|good evening|let'?s stand|worship team|"
@@ -55,6 +78,17 @@ WORSHIP_KEYWORDS = re.compile(
     re.IGNORECASE,
 )
 
+_TS_RE = re.compile(r"\[(\d+:\d{2}:\d{2})\]\s*")
+_VIDEO_ID_RE = re.compile(r"v=([a-zA-Z0-9_-]+)")
+
+GOODBYE_PHRASES = re.compile(
+    "|".join(map(re.escape, [
+        "thank you for coming", "dismissed", "have a great week",
+        "see you next", "god bless you all", "let's close in prayer",
+    ])),
+    re.IGNORECASE,
+)
+
 TEACHING_STARTS = re.compile(
     r"\b(turn with me to|open your bibles?|today we'?re (going to |gonna )?look|"
     r"let'?s pray|father god|lord we|the lord spoke|"
@@ -75,8 +109,7 @@ TEACHING_STARTS = re.compile(
 
 def parse_json3_file(filepath: str) -> Optional[dict]:
     try:
-        with open(filepath, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = orjson.loads(Path(filepath).read_bytes())
     except Exception as e:
         log.warning("Failed to parse %s: %s", filepath, e)
         return None
@@ -98,9 +131,10 @@ def parse_json3_file(filepath: str) -> Optional[dict]:
             segments.append({
                 "text": text,
                 "start_sec": start_ms / 1000.0,
+                "word_count": len(text.split()),
             })
 
-    if not segments:
+    if sum(s["word_count"] for s in segments) < CHUNK_MIN_WORDS:
         return None
 
     return {
@@ -118,25 +152,23 @@ def parse_batch_sermon(item: dict, source_file: str) -> Optional[dict]:
         return None
 
     url = item.get("url", "")
-    video_id_match = re.search(r"v=([a-zA-Z0-9_-]+)", url)
+    video_id_match = _VIDEO_ID_RE.search(url)
     video_id = video_id_match.group(1) if video_id_match else item.get("id", "").replace("youtube_", "")
 
-    ts_pattern = re.compile(r"\[(\d+:\d{2}:\d{2})\]\s*")
-    parts = ts_pattern.split(transcript)
+    matches = list(_TS_RE.finditer(transcript))
 
     segments = []
-    i = 1
-    while i < len(parts) - 1:
-        ts_str = parts[i]
-        text = parts[i + 1].strip()
-        h, m, s = ts_str.split(":")
-        start_sec = int(h) * 3600 + int(m) * 60 + int(s)
+    for a, b in zip(matches, matches[1:] + [None]):
+        text = transcript[a.end():b.start() if b else None].strip()
         if text:
-            segments.append({"text": text, "start_sec": float(start_sec)})
-        i += 2
+            h, m, s = a.group(1).split(":")
+            start_sec = int(h) * 3600 + int(m) * 60 + int(s)
+            segments.append({"text": text, "start_sec": float(start_sec),
+                             "word_count": len(text.split())})
 
     if not segments and transcript:
-        segments = [{"text": transcript, "start_sec": 0.0}]
+        segments = [{"text": transcript.strip(), "start_sec": 0.0,
+                     "word_count": len(transcript.split())}]
 
     if not segments:
         return None
@@ -159,6 +191,8 @@ def discover_sermons(limit: Optional[int] = None) -> list:
             continue
         files = sorted(Path(dir_path).glob("*.json3"))
         for fp in files:
+            if fp.stat().st_size < JSON3_MIN_BYTES:
+                continue
             all_sermons.append(("json3", str(fp)))
 
     if os.path.exists(BATCH_DIR):
@@ -178,23 +212,25 @@ def discover_sermons(limit: Optional[int] = None) -> list:
 # FILTERING
 # ---------------------------------------------------------------------------
 
-def is_worship_or_announcement(text: str) -> bool:
-    if len(text.split()) < 3:
+def is_worship_or_announcement(text: str, word_count: int) -> bool:
+    if word_count < 3:
         return True
     return bool(WORSHIP_KEYWORDS.search(text))
 
 
 def find_teaching_start(segments: list) -> int:
+    first_long_after_60 = None
     for i, seg in enumerate(segments):
-        if TEACHING_STARTS.search(seg["text"]):
+        text = seg["text"]
+        wc = seg["word_count"]
+        start_sec = seg["start_sec"]
+        if TEACHING_STARTS.search(text):
             return max(0, i - 1)
-        if seg["start_sec"] > 120 and len(seg["text"].split()) > 15:
-            if not is_worship_or_announcement(seg["text"]):
-                return i
-    for i, seg in enumerate(segments):
-        if seg["start_sec"] > 60 and len(seg["text"].split()) > 10:
+        if start_sec > 120 and wc > 15 and not is_worship_or_announcement(text, wc):
             return i
-    return 0
+        if first_long_after_60 is None and start_sec > 60 and wc > 10:
+            first_long_after_60 = i
+    return first_long_after_60 if first_long_after_60 is not None else 0
 
 
 def filter_segments(segments: list) -> list:
@@ -206,19 +242,15 @@ def filter_segments(segments: list) -> list:
 
     end_idx = len(teaching)
     for i in range(len(teaching) - 1, max(len(teaching) - 20, -1), -1):
-        text_lower = teaching[i]["text"].lower()
-        if any(kw in text_lower for kw in [
-            "thank you for coming", "dismissed", "have a great week",
-            "see you next", "god bless you all", "let's close in prayer"
-        ]):
+        if GOODBYE_PHRASES.search(teaching[i]["text"]):
             end_idx = i
             break
 
     filtered = []
     for seg in teaching[:end_idx]:
-        if seg["text"].strip() in ("[Music]", "[Applause]"):
+        if seg["text"] in ("[Music]", "[Applause]"):
             continue
-        if is_worship_or_announcement(seg["text"]) and len(seg["text"].split()) < 12:
+        if seg["word_count"] < 12 and is_worship_or_announcement(seg["text"], seg["word_count"]):
             continue
         filtered.append(seg)
 
@@ -234,23 +266,25 @@ def chunk_segments(segments: list, video_id: str, youtube_url: str,
     if not segments:
         return []
 
-    total_words = sum(len(s["text"].split()) for s in segments)
+    total_words = sum(s["word_count"] for s in segments)
     if total_words < CHUNK_MIN_WORDS:
         return []
 
     chunks = []
     current_texts = []
+    current_wcs = []
+    current_starts = []
     current_words = 0
-    chunk_start_sec = segments[0]["start_sec"]
+    overlap_count = 0
     chunk_end_sec = segments[0]["start_sec"]
 
+    # parse_* already emit stripped, non-empty text with a word count
     for seg in segments:
-        text = seg["text"].strip()
-        if not text:
-            continue
-        wc = len(text.split())
+        text = seg["text"]
+        wc = seg["word_count"]
 
-        if current_words + wc > CHUNK_MAX_WORDS and current_words >= CHUNK_MIN_WORDS:
+        if (current_words + wc > CHUNK_MAX_WORDS and current_words >= CHUNK_MIN_WORDS
+                and len(current_texts) > overlap_count):
             chunk_text = " ".join(current_texts)
             chunks.append({
                 "text": chunk_text,
@@ -258,19 +292,46 @@ def chunk_segments(segments: list, video_id: str, youtube_url: str,
                 "youtube_url": youtube_url,
                 "title": title,
                 "source_file": source_file,
-                "start_sec": int(chunk_start_sec),
+                "start_sec": int(current_starts[0]),
                 "end_sec": int(chunk_end_sec),
                 "word_count": current_words,
             })
-            current_texts = []
-            current_words = 0
-            chunk_start_sec = seg["start_sec"]
+            # Carry at most CHUNK_OVERLAP_WORDS words (never the first segment) into the
+            # next chunk for context, slicing inside a segment when needed
+            overlap_words = min(CHUNK_OVERLAP_WORDS, current_words - current_wcs[0])
+            keep = len(current_texts)
+            carried = 0
+            while carried < overlap_words:
+                keep -= 1
+                carried += current_wcs[keep]
+            tail = " ".join(current_texts[keep:]).split()[carried - overlap_words:]
+            current_starts = current_starts[keep:keep + 1] if tail else []
+            current_texts = [" ".join(tail)] if tail else []
+            current_wcs = [len(tail)] if tail else []
+            current_words = len(tail)
+            overlap_count = len(current_texts)
+
+        if overlap_count and current_words + wc > CHUNK_MAX_WORDS:
+            # Shrink the carried overlap so it never pushes a chunk past CHUNK_MAX_WORDS
+            drop = min(current_wcs[0], current_words + wc - CHUNK_MAX_WORDS)
+            tail = current_texts[0].split()[drop:]
+            if tail:
+                current_texts[0] = " ".join(tail)
+                current_wcs[0] = len(tail)
+            else:
+                current_texts = current_texts[1:]
+                current_wcs = current_wcs[1:]
+                current_starts = current_starts[1:]
+                overlap_count = 0
+            current_words -= drop
 
         current_texts.append(text)
+        current_wcs.append(wc)
+        current_starts.append(seg["start_sec"])
         current_words += wc
         chunk_end_sec = seg["start_sec"]
 
-    if current_texts and current_words >= CHUNK_MIN_WORDS // 2:
+    if len(current_texts) > overlap_count and current_words >= CHUNK_MIN_WORDS // 2:
         chunk_text = " ".join(current_texts)
         chunks.append({
             "text": chunk_text,
@@ -278,7 +339,7 @@ def chunk_segments(segments: list, video_id: str, youtube_url: str,
             "youtube_url": youtube_url,
             "title": title,
             "source_file": source_file,
-            "start_sec": int(chunk_start_sec),
+            "start_sec": int(current_starts[0]),
             "end_sec": int(chunk_end_sec),
             "word_count": current_words,
         })
@@ -361,50 +422,198 @@ def get_embedder():
     if _embedder is None:
         import torch
         os.environ["TOKENIZERS_PARALLELISM"] = "false"
+        torch.set_num_threads(os.cpu_count() or 1)
         from sentence_transformers import SentenceTransformer
-        log.info("Loading embedding model: %s", EMBED_MODEL)
-        _embedder = SentenceTransformer(EMBED_MODEL, device="cpu")
+        onnx_path = os.path.join(ONNX_MODEL_DIR, ONNX_QUANTIZED_FILE)
+        if os.path.exists(onnx_path):
+            log.info("Loading int8 ONNX embedding model: %s", onnx_path)
+            _embedder = SentenceTransformer(
+                ONNX_MODEL_DIR, device="cpu", backend="onnx",
+                model_kwargs={"file_name": ONNX_QUANTIZED_FILE},
+            )
+        else:
+            log.info("Loading embedding model: %s", EMBED_MODEL)
+            _embedder = SentenceTransformer(EMBED_MODEL, device="cpu")
+        _embedder.max_seq_length = EMBED_MAX_SEQ_LENGTH
         log.info("Model loaded (CPU)")
     return _embedder
 
 
+def export_onnx_model():
+    """One-time export of EMBED_MODEL to int8 ONNX; get_embedder picks it up after."""
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+    log.info("Exporting %s to ONNX", EMBED_MODEL)
+    model = SentenceTransformer(EMBED_MODEL, device="cpu", backend="onnx")
+    model.save(ONNX_MODEL_DIR)
+    export_dynamic_quantized_onnx_model(model, "avx512_vnni", ONNX_MODEL_DIR)
+    log.info("Saved quantized model: %s", os.path.join(ONNX_MODEL_DIR, ONNX_QUANTIZED_FILE))
+
+
+def content_hash(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
 class FaissStore:
-    def __init__(self, path: str, dim: int = 384, reset: bool = False):
+    def __init__(self, path: str, dim: int = 384, reset: bool = False,
+                 index_type: str = "flat", index_factory_string: Optional[str] = None,
+                 read_only: bool = False):
         import faiss as _faiss
         self._faiss = _faiss
         self.path = path
         self.index_file = os.path.join(path, "index.faiss")
-        self.meta_file = os.path.join(path, "metadata.json")
+        self.meta_file = os.path.join(path, "metadata.pkl")
+        self.json_meta_file = os.path.join(path, "metadata.json")
+        self.untrained_file = os.path.join(path, "untrained.npy")
         self.dim = dim
         self.documents = []
-        self.metadatas = []
+        self.seen_hashes = set()
+        self._untrained = []
+        self._reset_columns()
 
         os.makedirs(path, exist_ok=True)
 
-        if not reset and os.path.exists(self.index_file) and os.path.exists(self.meta_file):
-            self.index = _faiss.read_index(self.index_file)
-            with open(self.meta_file, "r") as f:
-                saved = json.load(f)
+        has_meta = os.path.exists(self.meta_file) or os.path.exists(self.json_meta_file)
+        if not reset and os.path.exists(self.index_file) and has_meta:
+            io_flags = 0
+            if read_only and os.path.getsize(self.index_file) > MMAP_THRESHOLD_BYTES:
+                # Page the index in on demand rather than reading it all into RAM
+                io_flags = _faiss.IO_FLAG_MMAP | _faiss.IO_FLAG_READ_ONLY
+            self.index = _faiss.read_index(self.index_file, io_flags)
+            self._configure_search()
+            if os.path.exists(self.meta_file):
+                with open(self.meta_file, "rb") as f:
+                    saved = pickle.load(f)
+            else:
+                saved = orjson.loads(Path(self.json_meta_file).read_bytes())
             self.documents = saved.get("documents", [])
-            self.metadatas = saved.get("metadatas", [])
-            log.info("Loaded FAISS index: %d vectors", self.index.ntotal)
+            if "columns" in saved:
+                self.cols = saved["columns"]
+                self.string_pool = saved["string_pool"]
+                self._string_ids = {s: i for i, s in enumerate(self.string_pool)}
+            else:
+                self._append_metadatas(saved.get("metadatas", []))
+            if "seen_hashes" in saved:
+                self.seen_hashes = saved["seen_hashes"]
+            elif not read_only:
+                self.seen_hashes = {content_hash(d) for d in self.documents}
+            if not self.index.is_trained and os.path.exists(self.untrained_file):
+                self._untrained = [np.load(self.untrained_file)]
+            log.info("Loaded FAISS index: %d vectors", self.count())
         else:
-            self.index = _faiss.IndexFlatIP(dim)
-            log.info("Created new FAISS index (dim=%d)", dim)
+            self.index = self._new_index(index_type, index_factory_string)
+            self._configure_search()
+            log.info("Created new FAISS %s index (dim=%d)",
+                     index_factory_string or index_type, self.dim)
+
+    def _new_index(self, index_type: str, index_factory_string: Optional[str] = None):
+        if index_factory_string:
+            return self._faiss.index_factory(
+                self.dim, index_factory_string, self._faiss.METRIC_INNER_PRODUCT)
+        if index_type == "hnsw":
+            index = self._faiss.IndexHNSWFlat(self.dim, HNSW_M, self._faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+            return index
+        return self._faiss.IndexFlatIP(self.dim)
+
+    def _configure_search(self):
+        if hasattr(self.index, "hnsw"):
+            self.index.hnsw.efSearch = HNSW_EF_SEARCH
+        if hasattr(self.index, "nprobe"):
+            self.index.nprobe = IVF_NPROBE
+
+    def _reset_columns(self):
+        self.cols = {name: array("i") for name in META_STR_COLUMNS + META_INT_COLUMNS}
+        self.string_pool = []
+        self._string_ids = {}
+
+    def _intern(self, value: str) -> int:
+        sid = self._string_ids.get(value)
+        if sid is None:
+            sid = len(self.string_pool)
+            self.string_pool.append(value)
+            self._string_ids[value] = sid
+        return sid
+
+    def _append_metadatas(self, metadatas: list):
+        for meta in metadatas:
+            for name in META_STR_COLUMNS:
+                self.cols[name].append(self._intern(meta.get(name, "")))
+            for name in META_INT_COLUMNS:
+                self.cols[name].append(int(meta.get(name, 0)))
+
+    def metadata(self, idx: int) -> dict:
+        pool = self.string_pool
+        meta = {name: pool[self.cols[name][idx]] for name in META_STR_COLUMNS}
+        for name in META_INT_COLUMNS:
+            meta[name] = self.cols[name][idx]
+        meta["clip_url"] = f"https://www.youtube.com/watch?v={meta['video_id']}&t={meta['start_sec']}s"
+        return meta
 
     def add(self, embeddings: np.ndarray, documents: list, metadatas: list):
-        self.index.add(embeddings.astype(np.float32))
+        # No copy when the encoder already returned contiguous float32
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
         self.documents.extend(documents)
-        self.metadatas.extend(metadatas)
+        self._append_metadatas(metadatas)
+        if self.index.is_trained:
+            self.index.add(embeddings)
+            return
+        # IVF-PQ needs a training set: hold vectors until there are enough of them
+        self._untrained.append(embeddings)
+        if sum(len(e) for e in self._untrained) >= IVF_MIN_VECTORS:
+            self.train_pending()
+
+    def train_pending(self):
+        """Train the quantizer on the held-back vectors and add them.
+
+        Small corpora that never reach IVF_MIN_VECTORS fall back to a flat index.
+        """
+        if not self._untrained:
+            return
+        embeddings = np.vstack(self._untrained)
+        self._untrained = []
+        if len(embeddings) < IVF_MIN_VECTORS:
+            log.info("Only %d vectors, too few for IVF-PQ; using flat index", len(embeddings))
+            self.index = self._faiss.IndexFlatIP(self.dim)
+        else:
+            rng = np.random.default_rng(0)
+            n_sample = min(len(embeddings), IVF_TRAIN_SAMPLE)
+            sample = embeddings[rng.choice(len(embeddings), n_sample, replace=False)]
+            log.info("Training IVF-PQ index on %d vectors", n_sample)
+            self.index.train(sample)
+            self._configure_search()
+        self.index.add(embeddings)
 
     def save(self):
+        if self._untrained:
+            # Checkpoint the vectors held back for training alongside the (untrained)
+            # index so a crash before training loses nothing; __init__ reloads them
+            held = np.vstack(self._untrained)
+            self._untrained = [held]
+            tmp = self.untrained_file + ".tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, held)
+            os.replace(tmp, self.untrained_file)
+            log.info("Index not trained yet; checkpointed %d held vectors", len(held))
+        elif os.path.exists(self.untrained_file):
+            os.remove(self.untrained_file)
         self._faiss.write_index(self.index, self.index_file)
-        with open(self.meta_file, "w") as f:
-            json.dump({"documents": self.documents, "metadatas": self.metadatas}, f)
-        log.info("Saved FAISS index: %d vectors", self.index.ntotal)
+        with open(self.meta_file, "wb") as f:
+            pickle.dump({
+                "documents": self.documents,
+                "columns": self.cols,
+                "string_pool": self.string_pool,
+                "seen_hashes": self.seen_hashes,
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+        log.info("Saved FAISS index: %d vectors", self.count())
+
+    def export_json(self):
+        metadatas = [self.metadata(i) for i in range(len(self.documents))]
+        with open(self.json_meta_file, "wb") as f:
+            f.write(orjson.dumps({"documents": self.documents, "metadatas": metadatas}))
+        log.info("Exported metadata JSON: %s", self.json_meta_file)
 
     def count(self):
-        return self.index.ntotal
+        return self.index.ntotal + sum(len(e) for e in self._untrained)
 
     def search(self, query_embedding: np.ndarray, k: int = 20):
         scores, indices = self.index.search(query_embedding.reshape(1, -1).astype(np.float32), k)
@@ -414,42 +623,55 @@ class FaissStore:
                 continue
             results.append({
                 "document": self.documents[idx],
-                "metadata": self.metadatas[idx],
+                "metadata": self.metadata(idx),
                 "score": float(score),
             })
         return results
 
 
-def init_store(reset: bool = False):
+def init_store(reset: bool = False, index_type: str = "flat"):
     embedder = get_embedder()
     dim = embedder.get_sentence_embedding_dimension()
-    store = FaissStore(VDB_PATH, dim=dim, reset=reset)
+    factory = IVF_PQ_FACTORY if index_type == "ivf" else None
+    store = FaissStore(VDB_PATH, dim=dim, reset=reset, index_type=index_type,
+                       index_factory_string=factory)
     return store
 
 
-def embed_and_store(chunks: list, store: FaissStore, batch_size: int = 8):
+def embed_chunks(chunks: list, store: FaissStore, batch_size: int = 64):
+    """Embed chunks not already in the store; returns (embeddings, documents, metadatas, hashes)."""
+    # Skip chunks whose text is already stored (re-uploaded sermons, overlapping dirs).
+    # New hashes are only recorded on the store once store.add succeeds.
+    unique = []
+    new_hashes = set()
+    for chunk in chunks:
+        h = content_hash(chunk["text"])
+        if h not in store.seen_hashes and h not in new_hashes:
+            new_hashes.add(h)
+            unique.append(chunk)
+    chunks = unique
     if not chunks:
-        return 0
+        return None
 
     embedder = get_embedder()
-    texts = [c["text"][:1500] for c in chunks]
-    all_embeddings = []
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i:i+batch_size]
-        emb = embedder.encode(batch, show_progress_bar=False, normalize_embeddings=True)
-        all_embeddings.append(emb)
-    embeddings = np.vstack(all_embeddings)
+    texts = [c["text"] for c in chunks]
+    # Pass the whole list so sentence-transformers can length-sort and pad per batch
+    embeddings = embedder.encode(
+        texts,
+        batch_size=batch_size,
+        normalize_embeddings=True,
+        show_progress_bar=False,
+        convert_to_numpy=True,
+    )
 
     documents = []
     metadatas = []
 
     for chunk in chunks:
-        clip_url = f"https://www.youtube.com/watch?v={chunk['video_id']}&t={chunk['start_sec']}s"
         documents.append(chunk["text"])
         metadatas.append({
             "video_id": chunk["video_id"],
             "youtube_url": chunk["youtube_url"],
-            "clip_url": clip_url,
             "title": chunk.get("title", ""),
             "source_file": chunk["source_file"],
             "start_sec": chunk["start_sec"],
@@ -457,7 +679,16 @@ def embed_and_store(chunks: list, store: FaissStore, batch_size: int = 8):
             "word_count": chunk["word_count"],
         })
 
-    store.add(np.array(embeddings), documents, metadatas)
+    return embeddings, documents, metadatas, new_hashes
+
+
+def store_pending(chunks: list, store: FaissStore) -> int:
+    embedded = embed_chunks(chunks, store)
+    if embedded is None:
+        return 0
+    embeddings, documents, metadatas, new_hashes = embedded
+    store.add(embeddings, documents, metadatas)
+    store.seen_hashes.update(new_hashes)
     return len(documents)
 
 
@@ -489,36 +720,51 @@ SYNONYM_MAP = {
 }
 
 
+QUERY_STOPWORDS = frozenset({
+    "what", "does", "how", "can", "the", "and", "for", "with", "that",
+    "this", "from", "have", "more", "when", "why", "who", "about",
+    "pastor", "bob", "say", "says", "tell", "bible", "according",
+})
+
+# Keywords are at least 3 chars and so is the shortest root ("sin"), so any root that
+# can prefix-match a keyword shares its first 3 chars
+_PREFIX_INDEX = defaultdict(list)
+for _root, _syns in SYNONYM_MAP.items():
+    _PREFIX_INDEX[_root[:3]].append((_root, _syns))
+
+
 def expand_query_keywords(query: str) -> list:
     words = re.findall(r"\b[a-z]+\b", query.lower())
-    stop = {"what", "does", "how", "can", "the", "and", "for", "with", "that",
-            "this", "from", "have", "more", "when", "why", "who", "about",
-            "pastor", "bob", "say", "says", "tell", "bible", "according"}
-    keywords = [w for w in words if w not in stop and len(w) > 2]
+    keywords = [w for w in words if w not in QUERY_STOPWORDS and len(w) > 2]
     expanded = set(keywords)
     for kw in keywords:
         if kw in SYNONYM_MAP:
             expanded.update(SYNONYM_MAP[kw])
-        for root, syns in SYNONYM_MAP.items():
+        for root, syns in _PREFIX_INDEX.get(kw[:3], ()):
             if kw.startswith(root[:4]) or root.startswith(kw[:4]):
                 expanded.add(root)
                 expanded.update(syns)
     return list(expanded)
 
 
-def keyword_boost(text: str, keywords: list) -> float:
-    text_lower = text.lower()
-    matches = sum(1 for kw in keywords if kw in text_lower)
-    if not keywords:
-        return 0.0
-    return min(matches / max(len(keywords), 1), 1.0)
+def keyword_boost(texts: list, keywords: list) -> np.ndarray:
+    """Fraction of keywords found in each text, as one array over all texts."""
+    if not keywords or not texts:
+        return np.zeros(len(texts))
+    text_lowers = [t.lower() for t in texts]
+    matches = np.zeros(len(text_lowers), dtype=np.int32)
+    for kw in keywords:
+        matches += np.fromiter((kw in t for t in text_lowers), dtype=np.int8,
+                               count=len(text_lowers))
+    return np.clip(matches / len(keywords), 0.0, 1.0)
 
 
 def answer_question(query: str, top_k: int = 5, threshold: float = 0.68,
                     store: FaissStore = None) -> dict:
     if store is None:
         embedder = get_embedder()
-        store = FaissStore(VDB_PATH, dim=embedder.get_sentence_embedding_dimension())
+        store = FaissStore(VDB_PATH, dim=embedder.get_sentence_embedding_dimension(),
+                           read_only=True)
 
     embedder = get_embedder()
     q_emb = embedder.encode([query], normalize_embeddings=True)
@@ -530,27 +776,23 @@ def answer_question(query: str, top_k: int = 5, threshold: float = 0.68,
         return {"answer_text": "No relevant teachings found.", "clips": []}
 
     keywords = expand_query_keywords(query)
-    candidates = []
-
-    for r in results:
-        doc = r["document"]
-        meta = r["metadata"]
-        cosine_sim = r["score"]
+    docs = [r["document"] for r in results]
+    cosine_sim = np.array([r["score"] for r in results])
+    kw_score = keyword_boost(docs, keywords)
+    meta_kw = keyword_boost(
+        [" ".join([r["metadata"].get("title", ""), r["document"][:200]]) for r in results],
+        keywords,
+    )
+    composite = 0.75 * cosine_sim + 0.15 * kw_score + 0.10 * meta_kw
 
-        kw_score = keyword_boost(doc, keywords)
-        meta_kw = keyword_boost(
-            " ".join([meta.get("title", ""), doc[:200]]),
-            keywords
-        )
-        composite = 0.75 * cosine_sim + 0.15 * kw_score + 0.10 * meta_kw
-
-        if composite >= threshold:
-            candidates.append({
-                "text": doc,
-                "meta": meta,
-                "score": round(composite, 4),
-                "cosine_sim": round(cosine_sim, 4),
-            })
+    candidates = []
+    for i in np.flatnonzero(composite >= threshold):
+        candidates.append({
+            "text": docs[i],
+            "meta": results[i]["metadata"],
+            "score": round(float(composite[i]), 4),
+            "cosine_sim": round(float(cosine_sim[i]), 4),
+        })
 
     candidates.sort(key=lambda x: -x["score"])
     top = candidates[:top_k]
@@ -584,9 +826,42 @@ def answer_question(query: str, top_k: int = 5, threshold: float = 0.68,
 # MAIN PIPELINE
 # ---------------------------------------------------------------------------
 
-def build_database(limit: Optional[int] = None, reset: bool = False):
+def _process_one(task: tuple) -> Optional[list]:
+    """Parse, filter and chunk one sermon in a worker process.
+
+    Returns None when the sermon is skipped, otherwise its (possibly empty) chunks.
+    """
+    source_type, source_data = task
+    try:
+        if source_type == "json3":
+            sermon = parse_json3_file(source_data)
+        else:
+            item, batch_file = source_data
+            sermon = parse_batch_sermon(item, batch_file)
+
+        if not sermon:
+            return None
+
+        filtered = filter_segments(sermon["segments"])
+        if not filtered:
+            return None
+
+        return chunk_segments(
+            filtered,
+            sermon["video_id"],
+            sermon["youtube_url"],
+            sermon["title"],
+            sermon["source_file"],
+        )
+    except Exception as e:
+        log.warning("Error processing sermon: %s", e)
+        return None
+
+
+def build_database(limit: Optional[int] = None, reset: bool = False,
+                   index_type: str = "flat"):
     sermons = discover_sermons(limit)
-    store = init_store(reset)
+    store = init_store(reset, index_type)
 
     existing = store.count()
     if existing > 0 and not reset:
@@ -596,12 +871,13 @@ def build_database(limit: Optional[int] = None, reset: bool = False):
     total_skipped = 0
     processed = 0
     sample_chunks = []
+    pending_chunks = []
 
     expanded = []
     for source_type, source_data in sermons:
         if source_type == "batch_file":
             try:
-                items = json.load(open(source_data, "r", encoding="utf-8"))
+                items = orjson.loads(Path(source_data).read_bytes())
                 for item in items:
                     expanded.append(("batch", (item, os.path.basename(source_data))))
             except Exception as e:
@@ -611,49 +887,40 @@ def build_database(limit: Optional[int] = None, reset: bool = False):
 
     log.info("Expanded to %d individual sermons", len(expanded))
 
-    pbar = tqdm(expanded, desc="Processing sermons", unit="sermon")
-    for source_type, source_data in pbar:
-        try:
-            if source_type == "json3":
-                sermon = parse_json3_file(source_data)
-            else:
-                item, batch_file = source_data
-                sermon = parse_batch_sermon(item, batch_file)
-
-            if not sermon:
-                total_skipped += 1
-                continue
-
-            filtered = filter_segments(sermon["segments"])
-            if not filtered:
+    # Parsing/chunking is pure Python and independent per sermon, so it runs in
+    # worker processes; the embedder and FAISS store stay in this process.
+    # Workers are spawned, not forked: torch's thread pool is already live here.
+    with ProcessPoolExecutor(max_workers=os.cpu_count(),
+                             mp_context=multiprocessing.get_context("spawn")) as executor:
+        results = executor.map(_process_one, expanded, chunksize=8)
+        pbar = tqdm(results, total=len(expanded), desc="Processing sermons", unit="sermon")
+        for chunks in pbar:
+            if chunks is None:
                 total_skipped += 1
                 continue
 
-            chunks = chunk_segments(
-                filtered,
-                sermon["video_id"],
-                sermon["youtube_url"],
-                sermon["title"],
-                sermon["source_file"],
-            )
-
             if chunks:
-                stored = embed_and_store(chunks, store)
-                total_chunks += stored
+                pending_chunks.extend(chunks)
                 if len(sample_chunks) < 10:
                     sample_chunks.append(chunks[0])
 
             processed += 1
-            pbar.set_postfix(chunks=total_chunks, skip=total_skipped)
+            pbar.set_postfix(chunks=total_chunks + len(pending_chunks), skip=total_skipped)
 
             if processed % CHECKPOINT_EVERY == 0:
-                store.save()
+                try:
+                    total_chunks += store_pending(pending_chunks, store)
+                    pending_chunks = []
+                    store.save()
+                except Exception as e:
+                    log.warning("Error embedding checkpoint batch: %s", e)
                 log.info("Checkpoint: %d sermons, %d chunks, %d skipped",
                          processed, total_chunks, total_skipped)
 
-        except Exception as e:
-            log.warning("Error processing sermon: %s", e)
-            total_skipped += 1
+    total_chunks += store_pending(pending_chunks, store)
+    pending_chunks = []
+
+    store.train_pending()
 
     log.info("=" * 60)
     store.save()
@@ -685,8 +952,22 @@ def main():
                         help="Number of results to return for queries")
     parser.add_argument("--threshold", type=float, default=0.40,
                         help="Minimum composite score threshold")
+    parser.add_argument("--export-onnx", action="store_true",
+                        help="Export an int8-quantized ONNX copy of the embedding model and exit")
+    parser.add_argument("--export-json", action="store_true",
+                        help="Write the stored metadata out as metadata.json and exit")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="hnsw",
+                        help="FAISS index for new stores (use flat for small test runs, ivf for 50k+ chunks)")
     args = parser.parse_args()
 
+    if args.export_onnx:
+        export_onnx_model()
+        return
+
+    if args.export_json:
+        FaissStore(VDB_PATH).export_json()
+        return
+
     if args.query:
         log.info("Querying: %s", args.query)
         result = answer_question(args.query, top_k=args.top_k, threshold=args.threshold)
@@ -701,7 +982,8 @@ def main():
         return
 
     start_time = time.time()
-    total = build_database(limit=args.limit, reset=args.reset)
+    total = build_database(limit=args.limit, reset=args.reset,
+                           index_type=args.index_type)
     elapsed = time.time() - start_time
     log.info("Total time: %.1f seconds (%.1f chunks/sec)", elapsed,
              total / max(elapsed, 1))
@@ -4,11 +4,17 @@ With Hybrid Search: Vector similarity + Keyword matching + Topic filtering
 Supports both local ChromaDB and Chroma Cloud
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import os
-import json
 import re
+import time
+from collections import Counter
+from functools import lru_cache
+import ahocorasick
+import numpy as np
+from numba import njit
+import orjson
 import chromadb
 from chromadb.config import Settings
 
@@ -24,9 +30,13 @@ client = None
 sermon_collection = None
 illustration_collection = None
 
-STOPWORDS = {'what', 'does', 'pastor', 'bob', 'teach', 'about', 'how', 'why', 
-             'when', 'where', 'says', 'tell', 'the', 'and', 'for', 'that', 
-             'this', 'with', 'from', 'have', 'has', 'can', 'you', 'your'}
+# Identical sermon queries are served from an in-process cache
+SEARCH_CACHE_CHECK_SECONDS = int(os.environ.get('SEARCH_CACHE_CHECK_SECONDS', 60))
+_search_cache_state = {'count': None, 'checked': 0.0}
+
+STOPWORDS = frozenset({'what', 'does', 'pastor', 'bob', 'teach', 'about', 'how', 'why', 
+                       'when', 'where', 'says', 'tell', 'the', 'and', 'for', 'that', 
+                       'this', 'with', 'from', 'have', 'has', 'can', 'you', 'your'})
 
 TOPIC_SYNONYMS = {
     'sovereignty': ['sovereign', 'control', 'authority', 'god in charge', 'god controls'],
@@ -51,6 +61,9 @@ TOPIC_SYNONYMS = {
     'anger': ['angry', 'wrath', 'rage', 'resentment'],
 }
 
+_KW_RE = re.compile(r'\b\w+\b')
+_SYN_TO_TOPIC = {syn: topic for topic, syns in TOPIC_SYNONYMS.items() for syn in syns}
+
 def init_db():
     global client, sermon_collection, illustration_collection
     
@@ -82,44 +95,195 @@ def init_db():
         print(f"illustrations collection not found: {e}")
         illustration_collection = None
 
+def base_keywords(query):
+    words = _KW_RE.findall(query.lower())
+    return [w for w in words if len(w) > 2 and w not in STOPWORDS]
+
 def extract_keywords(query):
-    words = re.findall(r'\b\w+\b', query.lower())
-    keywords = [w for w in words if len(w) > 2 and w not in STOPWORDS]
+    keywords = base_keywords(query)
     
     expanded = set(keywords)
     for word in keywords:
-        if word in TOPIC_SYNONYMS:
-            expanded.update(TOPIC_SYNONYMS[word])
-        for topic, synonyms in TOPIC_SYNONYMS.items():
-            if word in synonyms:
-                expanded.add(topic)
-                expanded.update(synonyms[:2])
+        expanded.update(TOPIC_SYNONYMS.get(word, ()))
+        topic = _SYN_TO_TOPIC.get(word)
+        if topic:
+            expanded.add(topic)
+            expanded.update(TOPIC_SYNONYMS[topic][:2])
     
     return list(expanded)
 
+@lru_cache(maxsize=256)
+def _keyword_automaton(keywords):
+    automaton = ahocorasick.Automaton()
+    for kw in keywords:
+        automaton.add_word(kw, kw)
+    automaton.make_automaton()
+    return automaton
+
 def keyword_match_score(text, keywords):
-    text_lower = text.lower()
-    matches = sum(1 for kw in keywords if kw in text_lower)
+    if not keywords:
+        return 0
+    # One pass over the text finds every keyword occurrence
+    automaton = _keyword_automaton(frozenset(keywords))
+    counts = Counter(kw for _, kw in automaton.iter(text.lower()))
+    matches = len(counts) + 0.5 * sum(1 for c in counts.values() if c >= 2)
     
-    for kw in keywords:
-        count = text_lower.count(kw)
-        if count >= 2:
-            matches += 0.5
+    return matches / len(keywords)
+
+@njit(cache=True)
+def _contains(hay, h0, h1, needle, n0, n1):
+    n = n1 - n0
+    for s in range(h0, h1 - n + 1):
+        j = 0
+        while j < n and hay[s + j] == needle[n0 + j]:
+            j += 1
+        if j == n:
+            return True
+    return False
+
+@njit(cache=True)
+def _topic_scores(topic_buf, topic_offsets, doc_offsets, kw_buf, kw_offsets):
+    n_docs = doc_offsets.size - 1
+    out = np.zeros(n_docs)
+    for d in range(n_docs):
+        t_first, t_last = doc_offsets[d], doc_offsets[d + 1]
+        for k in range(kw_offsets.size - 1):
+            k0, k1 = kw_offsets[k], kw_offsets[k + 1]
+            score = 0.0
+            for t in range(t_first, t_last):
+                a, b = topic_offsets[t], topic_offsets[t + 1]
+                if _contains(topic_buf, a, b, kw_buf, k0, k1):
+                    if b - a == k1 - k0:
+                        score = 1.0
+                        break
+                    score = 0.8
+                elif _contains(kw_buf, k0, k1, topic_buf, a, b):
+                    score = 0.8
+            # The first keyword touching any topic decides the score
+            if score > 0:
+                out[d] = score
+                break
+    return out
+
+def _pack(strings):
+    """Concatenate UTF-8 strings into one byte buffer plus offsets."""
+    encoded = [s.encode() for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+def topic_match_scores(topic_strs, keywords):
+    """Topic score per doc: 1.0 exact topic hit, 0.8 substring either way, else 0."""
+    topics = []
+    doc_offsets = np.zeros(len(topic_strs) + 1, dtype=np.int64)
+    for i, topics_str in enumerate(topic_strs):
+        if topics_str:
+            topics.extend(t.strip().lower() for t in topics_str.split(','))
+        doc_offsets[i + 1] = len(topics)
+    topic_buf, topic_offsets = _pack(topics)
+    kw_buf, kw_offsets = _pack(keywords)
+    return _topic_scores(topic_buf, topic_offsets, doc_offsets, kw_buf, kw_offsets)
+
+def query_sermons(query, n_results):
+    """Candidate pool for rerank, pre-filtered server-side on the query's own words.
+
+    Falls back to the wider unfiltered pool when the filter is too selective.
+    """
+    terms = base_keywords(query)[:3]
+    if terms:
+        # $contains is case-sensitive; also match capitalized forms (names, sentence starts)
+        variants = list(dict.fromkeys(v for t in terms for v in (t, t.capitalize())))
+        where_document = {'$contains': variants[0]} if len(variants) == 1 else \
+            {'$or': [{'$contains': v} for v in variants]}
+        results = sermon_collection.query(
+            query_texts=[query],
+            n_results=n_results * 2,
+            where_document=where_document
+        )
+        if results['documents'] and len(results['documents'][0]) >= n_results:
+            return results
     
-    return matches / len(keywords) if keywords else 0
+    return sermon_collection.query(
+        query_texts=[query],
+        n_results=n_results * 5
+    )
 
-def topic_match_score(topics_str, keywords):
-    if not topics_str:
-        return 0
-    topics = [t.strip().lower() for t in topics_str.split(',')]
+def vector_scores(results, n_docs, qi=0):
+    distances = results.get('distances')
+    if distances:
+        return 1.0 - np.asarray(distances[qi], dtype=float)
+    return np.full(n_docs, 0.5)
+
+def top_indices(combined, mask, n_results):
+    """Indices of the n_results best masked scores, best first."""
+    idx = np.flatnonzero(mask)
+    if n_results <= 0:
+        return idx[:0]
+    if idx.size > n_results:
+        idx = idx[np.argpartition(-combined[idx], n_results - 1)[:n_results]]
+    return idx[np.argsort(-combined[idx], kind='stable')]
+
+def _check_search_cache():
+    """Drop cached searches when the sermon collection changes size (polled)."""
+    now = time.monotonic()
+    if now - _search_cache_state['checked'] < SEARCH_CACHE_CHECK_SECONDS:
+        return
+    _search_cache_state['checked'] = now
+    count = sermon_collection.count()
+    if count != _search_cache_state['count']:
+        _search_cache_state['count'] = count
+        _do_sermon_search.cache_clear()
+
+def rank_sermons(results, keywords, n_results, qi=0):
+    """Hybrid rerank of one query's Chroma results (index qi) into response dicts."""
+    final_results = []
+    if results['documents'] and results['documents'][qi]:
+        docs = results['documents'][qi]
+        metas = results['metadatas'][qi]
+        vec = vector_scores(results, len(docs), qi)
+        kw_arr = np.array([keyword_match_score(doc, keywords) for doc in docs])
+        topic_arr = topic_match_scores([meta.get('topics', '') for meta in metas], keywords)
+        
+        combined = vec * 0.3 + kw_arr * 0.5 + topic_arr * 0.2
+        mask = (kw_arr >= 0.2) | (topic_arr != 0)
+        
+        for i in top_indices(combined, mask, n_results):
+            doc = docs[i]
+            meta = metas[i]
+            start_ms = meta.get('start_ms', 0)
+            if isinstance(start_ms, str):
+                start_ms = int(start_ms) if start_ms.isdigit() else 0
+            seconds = start_ms // 1000
+            
+            final_results.append({
+                'text': doc,
+                'title': meta.get('title', 'Sermon'),
+                'video_id': meta.get('video_id', ''),
+                'url': meta.get('url', ''),
+                'timestamped_url': f"{meta.get('url', '')}&t={seconds}s",
+                'start_time': meta.get('start_time', ''),
+                'end_time': meta.get('end_time', ''),
+                'topics': meta.get('topics', '').split(',') if meta.get('topics') else [],
+                'relevance_score': float(combined[i]),
+                'keyword_matches': float(kw_arr[i]),
+                'topic_match': float(topic_arr[i])
+            })
+    return final_results
+
+@lru_cache(maxsize=2048)
+def _do_sermon_search(query, n_results):
+    """Search + rerank for a normalized query, returned as serialized JSON bytes (no 'query' field)."""
+    keywords = extract_keywords(query)
+    print(f"Query: {query}, Keywords: {keywords}")
     
-    for kw in keywords:
-        if kw in topics:
-            return 1.0
-        for topic in topics:
-            if kw in topic or topic in kw:
-                return 0.8
-    return 0
+    results = query_sermons(query, n_results)
+    final_results = rank_sermons(results, keywords, n_results)
+    
+    return orjson.dumps({
+        'keywords': keywords,
+        'count': len(final_results),
+        'results': final_results
+    }, option=orjson.OPT_SORT_KEYS)
 
 @app.route('/api/sermon/search', methods=['POST'])
 def search_sermons():
@@ -131,59 +295,51 @@ def search_sermons():
         query = data.get('query', '')
         n_results = data.get('n_results', 5)
         
-        if not query:
+        if not query.strip():
             return jsonify({'error': 'Query required'}), 400
         
-        keywords = extract_keywords(query)
-        print(f"Query: {query}, Keywords: {keywords}")
+        _check_search_cache()
+        # Cache on the normalized query but echo back what the caller sent
+        body = _do_sermon_search(query.lower().strip(), n_results)
+        body = b'{"query":' + orjson.dumps(query) + b',' + body[1:]
+        return Response(body, status=200, mimetype='application/json')
+        
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/search/batch', methods=['POST'])
+def search_sermons_batch():
+    """Several sermon queries in one Chroma round trip (shared embedding pass)."""
+    try:
+        if not sermon_collection:
+            return jsonify({'error': 'Sermon collection not initialized', 'results': []}), 200
+        
+        data = request.json
+        queries = [q for q in data.get('queries', []) if q and q.strip()]
+        n_results = data.get('n_results', 5)
+        
+        if not queries:
+            return jsonify({'error': 'Queries required'}), 400
         
         results = sermon_collection.query(
-            query_texts=[query],
-            n_results=n_results * 5
+            query_texts=queries,
+            n_results=n_results * 3
         )
         
-        scored_results = []
-        if results['documents'] and results['documents'][0]:
-            for i, doc in enumerate(results['documents'][0]):
-                meta = results['metadatas'][0][i]
-                vector_score = 1 - results['distances'][0][i] if 'distances' in results and results['distances'] else 0.5
-                
-                kw_score = keyword_match_score(doc, keywords)
-                topic_score = topic_match_score(meta.get('topics', ''), keywords)
-                
-                combined_score = (vector_score * 0.3) + (kw_score * 0.5) + (topic_score * 0.2)
-                
-                if kw_score < 0.2 and topic_score == 0:
-                    continue
-                
-                start_ms = meta.get('start_ms', 0)
-                if isinstance(start_ms, str):
-                    start_ms = int(start_ms) if start_ms.isdigit() else 0
-                seconds = start_ms // 1000
-                
-                scored_results.append({
-                    'text': doc,
-                    'title': meta.get('title', 'Sermon'),
-                    'video_id': meta.get('video_id', ''),
-                    'url': meta.get('url', ''),
-                    'timestamped_url': f"{meta.get('url', '')}&t={seconds}s",
-                    'start_time': meta.get('start_time', ''),
-                    'end_time': meta.get('end_time', ''),
-                    'topics': meta.get('topics', '').split(',') if meta.get('topics') else [],
-                    'relevance_score': combined_score,
-                    'keyword_matches': kw_score,
-                    'topic_match': topic_score
-                })
+        batch = []
+        for qi, query in enumerate(queries):
+            keywords = extract_keywords(query)
+            final_results = rank_sermons(results, keywords, n_results, qi)
+            batch.append({
+                'query': query,
+                'keywords': keywords,
+                'count': len(final_results),
+                'results': final_results
+            })
         
-        scored_results.sort(key=lambda x: x['relevance_score'], reverse=True)
-        final_results = scored_results[:n_results]
-        
-        return jsonify({
-            'query': query,
-            'keywords': keywords,
-            'count': len(final_results),
-            'results': final_results
-        }), 200
+        return jsonify({'count': len(batch), 'results': batch}), 200
         
     except Exception as e:
         import traceback
@@ -210,26 +366,30 @@ def search_illustrations():
             n_results=n_results * 4
         )
         
-        scored_results = []
+        final_results = []
         seen = set()
         
         if results['documents'] and results['documents'][0]:
-            for i, doc in enumerate(results['documents'][0]):
-                meta = results['metadatas'][0][i]
+            docs = results['documents'][0]
+            metas = results['metadatas'][0]
+            vec = vector_scores(results, len(docs))
+            kept = []
+            kw_scores = []
+            topic_scores = []
+            topics_by_doc = {}
+            for i, doc in enumerate(docs):
+                meta = metas[i]
                 
-                key = f"{meta.get('summary', meta.get('illustration', ''))}-{meta.get('timestamp', '')}"
+                key = (meta.get('summary', meta.get('illustration', '')), meta.get('timestamp', ''))
                 if key in seen:
                     continue
                 seen.add(key)
                 
-                vector_score = 1 - results['distances'][0][i] if 'distances' in results and results['distances'] else 0.5
-                kw_score = keyword_match_score(doc, keywords)
-                
                 topics = []
                 topics_raw = meta.get('topics', '[]')
                 if isinstance(topics_raw, str):
                     try:
-                        topics = json.loads(topics_raw)
+                        topics = orjson.loads(topics_raw)
                     except:
                         topics = [t.strip() for t in topics_raw.split(',')]
                 else:
@@ -242,26 +402,32 @@ def search_illustrations():
                             topic_score = 1.0
                             break
                 
-                combined_score = (vector_score * 0.3) + (kw_score * 0.4) + (topic_score * 0.3)
-                
-                if kw_score < 0.15 and topic_score == 0:
-                    continue
-                
-                scored_results.append({
+                kept.append(i)
+                kw_scores.append(keyword_match_score(doc, keywords))
+                topic_scores.append(topic_score)
+                topics_by_doc[i] = topics
+            
+            kept = np.array(kept, dtype=int)
+            kw_arr = np.array(kw_scores)
+            topic_arr = np.array(topic_scores)
+            combined = vec[kept] * 0.3 + kw_arr * 0.4 + topic_arr * 0.3
+            mask = (kw_arr >= 0.15) | (topic_arr != 0)
+            
+            for j in top_indices(combined, mask, n_results):
+                i = kept[j]
+                meta = metas[i]
+                final_results.append({
                     'illustration': meta.get('summary', meta.get('illustration', '')),
                     'type': meta.get('type', ''),
-                    'text': doc,
+                    'text': docs[i],
                     'video_url': meta.get('youtube_url', meta.get('video_url', '')),
                     'timestamp': meta.get('timestamp', ''),
-                    'topics': topics,
+                    'topics': topics_by_doc[i],
                     'tone': meta.get('emotional_tone', meta.get('tone', '')),
                     'video_id': meta.get('video_id', ''),
-                    'relevance_score': combined_score
+                    'relevance_score': float(combined[j])
                 })
         
-        scored_results.sort(key=lambda x: x['relevance_score'], reverse=True)
-        final_results = scored_results[:n_results]
-        
         return jsonify({
             'query': query,
             'keywords': keywords,
@@ -300,9 +466,18 @@ def stats():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-if __name__ == '__main__':
+# Connect at import so every gunicorn worker has its collections before serving
+try:
     init_db()
+except Exception as e:
+    print(f"Failed to initialize ChromaDB: {e}")
+
+# WSGI entrypoint: gunicorn app:application -c gunicorn_conf.py
+application = app
+
+if __name__ == '__main__':
+    # Local development only; deployments run under gunicorn
     port = int(os.environ.get('PORT', 5001))
     print(f"ChromaDB API starting on port {port}")
     print("Using hybrid search: vector + keyword + topic matching")
-    app.run(host='0.0.0.0', port=port)
+    app.run(host='0.0.0.0', port=port, threaded=True)
@@ -0,0 +1,14 @@
+"""
+Gunicorn settings for the ChromaDB API
+Threaded workers so slow Chroma queries overlap instead of queueing
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5001)}"
+# Each worker loads Chroma + the ONNX embedder in a shared container (and Railway
+# reports the host's CPU count), so keep one worker and let threads supply concurrency
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = 120
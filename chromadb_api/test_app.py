@@ -0,0 +1,72 @@
+"""
+Tests for the sermon candidate pre-filter in app.py
+Run from chromadb_api/: python -m pytest -q
+"""
+
+import os
+import tempfile
+
+import pytest
+
+pytest.importorskip("chromadb")
+
+# Keep the import-time init_db() away from real databases
+os.environ.pop('CHROMA_API_KEY', None)
+os.environ['CHROMADB_PATH'] = tempfile.mkdtemp()
+
+import app
+
+
+class FakeCollection:
+    """Just enough of a Chroma collection: case-sensitive $contains / $or filtering."""
+
+    def __init__(self, documents):
+        self.documents = documents
+
+    def count(self):
+        return len(self.documents)
+
+    def _matches(self, doc, where_document):
+        if '$or' in where_document:
+            return any(self._matches(doc, clause) for clause in where_document['$or'])
+        return where_document['$contains'] in doc
+
+    def query(self, query_texts, n_results, where_document=None):
+        docs = [d for d in self.documents
+                if where_document is None or self._matches(d, where_document)][:n_results]
+        return {
+            'ids': [[str(i) for i in range(len(docs))]],
+            'documents': [docs],
+            'metadatas': [[{} for _ in docs]],
+            'distances': [[0.5 for _ in docs]],
+        }
+
+
+def test_prefilter_matches_capitalized_terms(monkeypatch):
+    capitalized_only = "Jesus spoke to the crowd on the mountain that day."
+    monkeypatch.setattr(app, 'sermon_collection', FakeCollection([
+        "we forgive because we have been forgiven much",
+        "learning to forgive a brother who wronged you",
+        "to forgive is hard but it sets you free",
+        capitalized_only,
+    ]))
+
+    results = app.query_sermons("jesus forgive", n_results=2)
+
+    assert capitalized_only in results['documents'][0]
+
+
+def test_search_echoes_original_query(monkeypatch):
+    monkeypatch.setattr(app, 'sermon_collection', FakeCollection([
+        "Jesus taught us to forgive one another",
+    ]))
+    app._do_sermon_search.cache_clear()
+    client = app.app.test_client()
+
+    first = client.post('/api/sermon/search', json={'query': 'Jesus Forgive '}).get_json()
+    second = client.post('/api/sermon/search', json={'query': 'jesus forgive'}).get_json()
+
+    assert first['query'] == 'Jesus Forgive '
+    assert second['query'] == 'jesus forgive'
+    assert first['results'] == second['results']
+    assert app._do_sermon_search.cache_info().hits == 1
@@ -2,50 +2,57 @@
 """
 Export sermons using the existing sermon indexer
 """
+import os
 import sys
-import json
+import orjson
 from sermon_indexer import SermonIndexer
 
 # Initialize the indexer with existing database
 indexer = SermonIndexer(db_path="./sermon_vector_db")
 
-print("Searching for all sermons...")
+print("Loading all sermon segments...")
 
-# Common topics to search for
+# Common topics to export
 topics = [
     "faith", "love", "forgiveness", "prayer", "hope", 
     "salvation", "grace", "healing", "wisdom", "peace",
     "joy", "patience", "kindness", "purpose", "worship"
 ]
 
+# One bulk read of the collection; topics are assigned locally from the
+# segment's own topic tags and text instead of running a vector search per topic
+results = indexer.collection.get(include=["documents", "metadatas"])
+
 all_sermons = []
 seen_ids = set()
 
-for topic in topics:
-    print(f"Searching for {topic}...")
-    results = indexer.search(topic, n_results=100)
+for doc, meta in zip(results["documents"], results["metadatas"]):
+    text_lower = doc.lower()
+    segment_topics = meta.get("topics", "").lower()
+    matched = [t for t in topics if t in segment_topics or t in text_lower]
+    if not matched:
+        continue
+    
+    # Create a unique ID
+    segment_id = f"{meta['video_id']}_{meta['start_time']}"
     
-    for result in results:
-        # Create a unique ID
-        segment_id = f"{result['video_id']}_{result['start_time']}"
-        
-        if segment_id not in seen_ids:
-            seen_ids.add(segment_id)
-            all_sermons.append({
-                "id": segment_id,
-                "text": result["text"],
-                "title": result["title"],
-                "video_id": result["video_id"],
-                "start_time": result["start_time"],
-                "url": result["url"],
-                "topics": [topic]  # Simple topic assignment
-            })
+    if segment_id not in seen_ids:
+        seen_ids.add(segment_id)
+        all_sermons.append({
+            "id": segment_id,
+            "text": doc,
+            "title": meta["title"],
+            "video_id": meta["video_id"],
+            "start_time": meta["start_time"],
+            "url": meta["url"],
+            "topics": matched
+        })
 
 print(f"Found {len(all_sermons)} unique sermon segments")
 
 # Save to JSON
-with open("sermons_export.json", "w") as f:
-    json.dump(all_sermons, f, separators=(',', ':'))
+with open("sermons_export.json", "wb") as f:
+    f.write(orjson.dumps(all_sermons))
 
-file_size_mb = len(json.dumps(all_sermons, separators=(',', ':'))) / 1024 / 1024
+file_size_mb = os.path.getsize("sermons_export.json") / 1024 / 1024
 print(f"Exported to sermons_export.json ({file_size_mb:.2f} MB)")
\ No newline at end of file
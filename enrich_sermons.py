@@ -18,7 +18,9 @@ import json
 import re
 import asyncio
 import aiohttp
+import orjson
 import time
+from aiolimiter import AsyncLimiter
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -29,17 +31,14 @@ CHROMA_API_KEY = os.environ.get('CHROMA_API_KEY', 'ck-Ci7fQVMx8Q6nENxr8daGNYYNj2
 CHROMA_TENANT = os.environ.get('CHROMA_TENANT', '4b12a7c7-2fb4-4edc-9b6e-c2a77305136b')
 CHROMA_DATABASE = os.environ.get('CHROMA_DATABASE', 'APB')
 
-BATCH_SIZE = 10
 PROGRESS_FILE = './enrich_sermons_progress.json'
+PROGRESS_LOG = './enrich_sermons_processed.log'  # one enriched id per line, append-only
 
-ANALYSIS_PROMPT = """Analyze this sermon transcript segment from Pastor Bob Kopeny.
+# Client-side pacing keeps requests under the x.ai quota instead of reacting to 429s
+XAI_RPS = float(os.environ.get('XAI_RPS', '8'))
+LIMITER = AsyncLimiter(max_rate=XAI_RPS, time_period=1)
 
-Segment text:
----
-{text}
----
-
-Sermon title: {title}
+SYSTEM_PROMPT = """You analyze sermon transcript segments from Pastor Bob Kopeny.
 
 Provide a JSON object with:
 1. "main_topic": The PRIMARY theological/life concept (1-3 words, e.g., "forgiveness", "God's sovereignty", "marriage", "prayer life")
@@ -54,64 +53,90 @@ IMPORTANT:
 - Questions should be natural questions a church member would ask
 - Be specific with topics (not just "faith" but "faith during trials" if that's what it's about)
 
-Return ONLY valid JSON, no markdown:"""
+Return ONLY valid JSON, no markdown."""
+
+# Only the per-segment part goes in the user message; the static instructions stay in SYSTEM_PROMPT
+USER_TEMPLATE = "Sermon title: {title}\n---\n{text}"
 
-async def analyze_segment(text, title, semaphore, retry_count=0):
+async def analyze_segment(session, text, title, semaphore, retry_count=0):
     if not text or len(text.strip()) < 50:
         return None
 
     async with semaphore:
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    'https://api.x.ai/v1/chat/completions',
-                    headers={
-                        'Content-Type': 'application/json',
-                        'Authorization': f'Bearer {XAI_API_KEY}'
-                    },
-                    json={
-                        'model': 'grok-3-mini-fast',
-                        'messages': [{'role': 'user', 'content': ANALYSIS_PROMPT.format(text=text[:2000], title=title)}],
-                        'temperature': 0.2,
-                        'max_tokens': 800
-                    },
-                    timeout=aiohttp.ClientTimeout(total=30)
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        content = data['choices'][0]['message']['content'].strip()
-                        if content.startswith('```'):
-                            content = re.sub(r'^```json?\n?', '', content)
-                            content = re.sub(r'\n?```$', '', content)
-                        return json.loads(content)
-                    elif response.status == 429:
-                        wait = min(2 ** retry_count * 2, 30)
-                        print(f"  Rate limited, waiting {wait}s...")
-                        await asyncio.sleep(wait)
-                        if retry_count < 5:
-                            return await analyze_segment(text, title, semaphore, retry_count + 1)
-                    else:
-                        error_text = await response.text()
-                        print(f"  API error {response.status}: {error_text[:100]}")
-        except json.JSONDecodeError as e:
+            await LIMITER.acquire()
+            async with session.post(
+                'https://api.x.ai/v1/chat/completions',
+                headers={
+                    'Content-Type': 'application/json',
+                    'Authorization': f'Bearer {XAI_API_KEY}'
+                },
+                json={
+                    'model': 'grok-3-mini-fast',
+                    'messages': [
+                        {'role': 'system', 'content': SYSTEM_PROMPT},
+                        {'role': 'user', 'content': USER_TEMPLATE.format(title=title, text=text[:2000])}
+                    ],
+                    'temperature': 0.2,
+                    'max_tokens': 800
+                }
+            ) as response:
+                if response.status == 200:
+                    data = orjson.loads(await response.read())
+                    content = data['choices'][0]['message']['content'].strip()
+                    if content.startswith('```'):
+                        content = re.sub(r'^```json?\n?', '', content)
+                        content = re.sub(r'\n?```$', '', content)
+                    return orjson.loads(content)
+                elif response.status == 429:
+                    retry_after = response.headers.get('Retry-After', '')
+                    wait = float(retry_after) if retry_after.replace('.', '', 1).isdigit() else min(2 ** retry_count * 2, 30)
+                    print(f"  Rate limited, waiting {wait}s...")
+                    await asyncio.sleep(wait)
+                    if retry_count < 5:
+                        return await analyze_segment(session, text, title, semaphore, retry_count + 1)
+                else:
+                    error_text = await response.text()
+                    print(f"  API error {response.status}: {error_text[:100]}")
+        except orjson.JSONDecodeError as e:
             print(f"  JSON parse error: {e}")
         except Exception as e:
             print(f"  Error: {e}")
             if retry_count < 3:
                 await asyncio.sleep(2)
-                return await analyze_segment(text, title, semaphore, retry_count + 1)
+                return await analyze_segment(session, text, title, semaphore, retry_count + 1)
     return None
 
 def load_progress():
     if os.path.exists(PROGRESS_FILE):
         with open(PROGRESS_FILE, 'r') as f:
             return json.load(f)
-    return {'processed_ids': [], 'enriched_count': 0, 'offset': 0}
+    return {'enriched_count': 0, 'offset': 0}
 
 def save_progress(progress):
+    """Small sidecar with offset/enriched_count; processed ids live in PROGRESS_LOG"""
     with open(PROGRESS_FILE, 'w') as f:
         json.dump(progress, f)
 
+def load_processed_ids(progress):
+    processed = set(progress.pop('processed_ids', []))  # older progress files kept ids inline
+    if os.path.exists(PROGRESS_LOG):
+        with open(PROGRESS_LOG, 'r') as f:
+            processed.update(f.read().split())
+    return processed
+
+def append_progress(ids):
+    with open(PROGRESS_LOG, 'a') as f:
+        f.write('\n'.join(ids) + '\n')
+
+async def fetch_page(collection, offset, limit):
+    return await asyncio.to_thread(
+        collection.get,
+        limit=limit,
+        offset=offset,
+        include=['documents', 'metadatas']
+    )
+
 async def main():
     if not XAI_API_KEY:
         print("ERROR: XAI_API_KEY not set")
@@ -132,63 +157,71 @@ async def main():
     progress = load_progress()
     offset = progress.get('offset', 0)
     enriched_total = progress.get('enriched_count', 0)
-    processed_set = set(progress.get('processed_ids', []))
+    processed_set = load_processed_ids(progress)
 
     print(f"Resuming from offset {offset}, {enriched_total} already enriched")
 
-    semaphore = asyncio.Semaphore(5)
+    # LIMITER is the primary gate; the semaphore only caps in-flight requests
+    semaphore = asyncio.Semaphore(20)
     fetch_batch = 50
 
-    while offset < total:
-        print(f"\n--- Fetching batch at offset {offset}/{total} ---")
-        try:
-            results = collection.get(
-                limit=fetch_batch,
-                offset=offset,
-                include=['documents', 'metadatas']
-            )
-        except Exception as e:
-            print(f"Fetch error: {e}")
-            offset += fetch_batch
-            continue
-
-        if not results['ids']:
-            break
-
-        segments_to_analyze = []
-        for i, doc_id in enumerate(results['ids']):
-            if doc_id in processed_set:
-                continue
-            meta = results['metadatas'][i]
-            if meta.get('main_topic'):
-                processed_set.add(doc_id)
+    # One pooled keep-alive session for every x.ai call
+    session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=20, keepalive_timeout=60),
+        timeout=aiohttp.ClientTimeout(total=30)
+    )
+    try:
+        # The next Chroma page is fetched in a thread while the current page is analyzed
+        next_page = asyncio.create_task(fetch_page(collection, offset, fetch_batch)) if offset < total else None
+
+        while offset < total:
+            print(f"\n--- Fetching batch at offset {offset}/{total} ---")
+            next_offset = offset + fetch_batch
+            try:
+                results = await next_page
+            except Exception as e:
+                print(f"Fetch error: {e}")
+                results = None
+            next_page = asyncio.create_task(fetch_page(collection, next_offset, fetch_batch)) if next_offset < total else None
+
+            if results is None:
+                offset = next_offset
                 continue
-            segments_to_analyze.append({
-                'id': doc_id,
-                'text': results['documents'][i],
-                'title': meta.get('title', 'Unknown Sermon'),
-                'metadata': meta
-            })
 
-        if not segments_to_analyze:
-            offset += fetch_batch
-            continue
-
-        print(f"  Analyzing {len(segments_to_analyze)} segments...")
+            if not results['ids']:
+                break
+
+            segments_to_analyze = []
+            for i, doc_id in enumerate(results['ids']):
+                if doc_id in processed_set:
+                    continue
+                meta = results['metadatas'][i]
+                if meta.get('main_topic'):
+                    processed_set.add(doc_id)
+                    continue
+                segments_to_analyze.append({
+                    'id': doc_id,
+                    'text': results['documents'][i],
+                    'title': meta.get('title', 'Unknown Sermon'),
+                    'metadata': meta
+                })
+
+            if not segments_to_analyze:
+                offset = next_offset
+                continue
 
-        for batch_start in range(0, len(segments_to_analyze), BATCH_SIZE):
-            batch = segments_to_analyze[batch_start:batch_start + BATCH_SIZE]
+            print(f"  Analyzing {len(segments_to_analyze)} segments...")
 
             tasks = [
-                analyze_segment(seg['text'], seg['title'], semaphore)
-                for seg in batch
+                analyze_segment(session, seg['text'], seg['title'], semaphore)
+                for seg in segments_to_analyze
             ]
             results_ai = await asyncio.gather(*tasks)
 
             ids_to_update = []
             metas_to_update = []
 
-            for seg, enrichment in zip(batch, results_ai):
+            for seg, enrichment in zip(segments_to_analyze, results_ai):
                 if enrichment:
                     updated_meta = dict(seg['metadata'])
                     updated_meta['main_topic'] = enrichment.get('main_topic', '')
@@ -206,21 +239,29 @@ async def main():
 
             if ids_to_update:
                 try:
-                    collection.update(
+                    await asyncio.to_thread(
+                        collection.update,
                         ids=ids_to_update,
                         metadatas=metas_to_update
                     )
+                    append_progress(ids_to_update)
                     print(f"  Updated {len(ids_to_update)} segments (total enriched: {enriched_total})")
                 except Exception as e:
                     print(f"  Update error: {e}")
 
-            await asyncio.sleep(0.2)
+            offset = next_offset
+            progress['offset'] = offset
+            progress['enriched_count'] = enriched_total
+            save_progress(progress)
+
+        if next_page:
+            next_page.cancel()
 
-        offset += fetch_batch
-        progress['offset'] = offset
-        progress['enriched_count'] = enriched_total
-        progress['processed_ids'] = list(processed_set)[-10000:]
-        save_progress(progress)
+        # Clean finish: the saved offset covers every page, so the id log can go
+        if os.path.exists(PROGRESS_LOG):
+            os.remove(PROGRESS_LOG)
+    finally:
+        await session.close()
 
     print(f"\n{'='*50}")
     print(f"COMPLETE: Enriched {enriched_total} segments total")
@@ -2,7 +2,8 @@
 """
 Export sermons from ChromaDB to JSON for Node.js integration
 """
-import json
+import os
+import orjson
 import chromadb
 from chromadb.config import Settings
 
@@ -35,8 +36,8 @@ print(f"Found {len(sermons)} sermon segments")
 
 # Export to JSON
 output_file = "sermons_data.json"
-with open(output_file, 'w') as f:
-    json.dump(sermons, f, indent=2)
+with open(output_file, 'wb') as f:
+    f.write(orjson.dumps(sermons))
 
 print(f"Exported to {output_file}")
-print(f"File size: {len(json.dumps(sermons)) / 1024 / 1024:.2f} MB")
\ No newline at end of file
+print(f"File size: {os.path.getsize(output_file) / 1024 / 1024:.2f} MB")
\ No newline at end of file
@@ -1,23 +1,52 @@
 #!/usr/bin/env python3
-"""Export ChromaDB data directly from SQLite to JSON"""
+"""Export ChromaDB data directly from SQLite to NDJSON (one record per line)
 
+Embeddings are inlined as fp32 by default (what migrate_to_chroma_cloud.py needs).
+Pass --int8-embeddings (for Node consumers) to write them to a side .bin file as
+per-vector int8 (q * scale ~ original); the NDJSON line then holds
+embedding_offset/embedding_dim/embedding_scale, and dot products are recovered
+as (q_a @ q_b) * scale_a * scale_b.
+"""
+
+import os
+import sys
 import sqlite3
-import json
-import struct
+from contextlib import nullcontext
+from itertools import groupby
+import numpy as np
+import orjson
 
 DB_PATH = './sermon_vector_db/chroma.sqlite3'
-OUTPUT_FILE = './sermon_export.json'
+OUTPUT_FILE = './sermon_export.ndjson'
+EMBEDDINGS_FILE = './sermon_export_embeddings.bin'
 
 def decode_embedding(blob):
-    """Decode binary embedding to list of floats"""
+    """View binary embedding as a float32 array (no copy)"""
     if not blob:
         return None
-    n_floats = len(blob) // 4
-    return list(struct.unpack(f'{n_floats}f', blob))
+    return np.frombuffer(blob, dtype='<f4')
+
+def quantize_int8(vec):
+    """Symmetric per-vector int8 quantization: vec ~ q * scale"""
+    scale = float(np.abs(vec).max()) / 127.0 or 1.0
+    return np.round(vec / scale).astype(np.int8), scale
+
+def decode_int8(buf, offset, dim, scale):
+    """Restore a float32 vector from the .bin export (Node: new Int8Array(buf, offset, dim) * scale)"""
+    return np.frombuffer(buf, dtype=np.int8, count=dim, offset=offset).astype(np.float32) * scale
 
-def export():
+def export(int8_embeddings=False):
     print(f"Connecting to {DB_PATH}...")
-    conn = sqlite3.connect(DB_PATH)
+    # Read-only bulk scan: mmap'd pages, big cache, in-memory sort for ORDER BY
+    # (journal/sync PRAGMAs are left alone: changing them on a read-only WAL DB fails)
+    conn = sqlite3.connect(f'file:{DB_PATH}?mode=ro', uri=True)
+    for pragma in (
+        "query_only = 1",
+        "mmap_size = 34359738368",
+        "cache_size = -524288",
+        "temp_store = MEMORY",
+    ):
+        conn.execute(f"PRAGMA {pragma}")
     
     print("Getting segments...")
     cursor = conn.execute("""
@@ -35,58 +64,76 @@ def export():
     for row in sample[:2]:
         print(f"  ID: {row[0][:20]}..., Doc length: {len(row[1]) if row[1] else 0}")
     
-    print("\nExporting all data...")
+    print(f"\nExporting all data to {OUTPUT_FILE}...")
     
+    # One ordered join instead of a metadata query per embedding
     cursor = conn.execute("""
         SELECT 
             e.id,
-            group_concat(CASE WHEN em.key = 'chroma:document' THEN em.string_value END) as document,
-            e.embedding
+            e.embedding,
+            em.key,
+            em.string_value,
+            em.int_value,
+            em.float_value
         FROM embeddings e
         LEFT JOIN embedding_metadata em ON e.id = em.id
-        GROUP BY e.id
+        ORDER BY e.id
     """)
+    cursor.arraysize = 10000
     
-    all_data = []
     count = 0
+    bytes_written = 0
     
-    for row in cursor:
-        doc_id, document, embedding_blob = row
-        
-        metadata_cursor = conn.execute("""
-            SELECT key, string_value, int_value, float_value
-            FROM embedding_metadata
-            WHERE id = ? AND key != 'chroma:document'
-        """, (doc_id,))
-        
-        metadata = {}
-        for meta_row in metadata_cursor:
-            key, str_val, int_val, float_val = meta_row
-            if str_val is not None:
-                metadata[key] = str_val
-            elif int_val is not None:
-                metadata[key] = int_val
-            elif float_val is not None:
-                metadata[key] = float_val
-        
-        all_data.append({
-            'id': doc_id,
-            'document': document,
-            'metadata': metadata,
-            'embedding': decode_embedding(embedding_blob)
-        })
-        
-        count += 1
-        if count % 10000 == 0:
-            print(f"  Processed {count} rows...")
+    bin_offset = 0
     
-    conn.close()
+    emb_file = open(EMBEDDINGS_FILE, 'wb') if int8_embeddings else nullcontext()
+    with open(OUTPUT_FILE, 'wb') as out, emb_file as emb_out:
+        for doc_id, rows in groupby(cursor, key=lambda r: r[0]):
+            document = None
+            embedding_blob = None
+            metadata = {}
+            for _, embedding_blob, key, str_val, int_val, float_val in rows:
+                if key is None:
+                    continue
+                if key == 'chroma:document':
+                    document = str_val
+                elif str_val is not None:
+                    metadata[key] = str_val
+                elif int_val is not None:
+                    metadata[key] = int_val
+                elif float_val is not None:
+                    metadata[key] = float_val
+            
+            record = {
+                'id': doc_id,
+                'document': document,
+                'metadata': metadata
+            }
+            embedding = decode_embedding(embedding_blob)
+            if not int8_embeddings or embedding is None:
+                record['embedding'] = embedding
+            else:
+                q, scale = quantize_int8(embedding)
+                emb_out.write(q.tobytes())
+                record['embedding_offset'] = bin_offset
+                record['embedding_dim'] = q.size
+                record['embedding_scale'] = scale
+                bin_offset += q.size
+            
+            line = orjson.dumps(record, option=orjson.OPT_SERIALIZE_NUMPY) + b'\n'
+            out.write(line)
+            bytes_written += len(line)
+            
+            count += 1
+            if count % 10000 == 0:
+                print(f"  Processed {count} rows ({bytes_written / 1024 / 1024:.1f} MB)...")
     
-    print(f"\nWriting {len(all_data)} records to {OUTPUT_FILE}...")
-    with open(OUTPUT_FILE, 'w') as f:
-        json.dump(all_data, f)
+    conn.close()
     
-    print(f"Done! File size: {len(open(OUTPUT_FILE).read()) / 1024 / 1024:.1f} MB")
+    print(f"\nWrote {count} records to {OUTPUT_FILE}")
+    print(f"Done! File size: {os.path.getsize(OUTPUT_FILE) / 1024 / 1024:.1f} MB")
+    if int8_embeddings:
+        print(f"Embeddings: {os.path.getsize(EMBEDDINGS_FILE) / 1024 / 1024:.1f} MB in {EMBEDDINGS_FILE}")
 
 if __name__ == '__main__':
-    export()
+    export(int8_embeddings='--int8-embeddings' in sys.argv)
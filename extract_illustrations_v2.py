@@ -14,124 +14,172 @@ Usage:
 
 import os
 import sys
-import json
 import re
 import argparse
+import multiprocessing
 from pathlib import Path
-from datetime import timedelta
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from bisect import bisect_right
+import hashlib
 import asyncio
 import aiohttp
+import ahocorasick
+import numpy as np
+from numba import njit
+import orjson
+try:
+    import ijson
+except ImportError:
+    ijson = None
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
 
 XAI_API_KEY = os.environ.get('XAI_API_KEY')
 
+def iter_json3_events(filepath):
+    """Stream transcript events one at a time (ijson), or parse the file whole with orjson."""
+    with open(filepath, 'rb') as f:
+        if ijson is not None:
+            yield from ijson.items(f, 'events.item', use_float=True)
+        else:
+            yield from orjson.loads(f.read()).get('events', [])
+
 def parse_json3_file(filepath):
     """Parse a YouTube JSON3 transcript file and extract text with timestamps."""
+    video_id = Path(filepath).stem.replace('.en', '')
+    
+    segments = []
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        for event in iter_json3_events(filepath):
+            if 'segs' in event:
+                start_ms = event.get('tStartMs', 0)
+                text_parts = []
+                for seg in event['segs']:
+                    if 'utf8' in seg:
+                        text_parts.append(seg['utf8'])
+                
+                text = ''.join(text_parts).strip()
+                if text and text not in ['[Music]', '[Applause]', '\n']:
+                    segments.append({
+                        'start_ms': start_ms,
+                        'start_time': format_timestamp(start_ms),
+                        'text': text
+                    })
     except Exception as e:
         print(f"Error reading {filepath}: {e}")
         return None, None
     
-    video_id = Path(filepath).stem.replace('.en', '')
-    events = data.get('events', [])
-    
-    segments = []
-    for event in events:
-        if 'segs' in event:
-            start_ms = event.get('tStartMs', 0)
-            text_parts = []
-            for seg in event['segs']:
-                if 'utf8' in seg:
-                    text_parts.append(seg['utf8'])
-            
-            text = ''.join(text_parts).strip()
-            if text and text not in ['[Music]', '[Applause]', '\n']:
-                segments.append({
-                    'start_ms': start_ms,
-                    'start_time': format_timestamp(start_ms),
-                    'text': text
-                })
-    
     return video_id, segments
 
 def format_timestamp(ms):
     """Convert milliseconds to HH:MM:SS format."""
-    seconds = ms // 1000
-    hours = seconds // 3600
-    minutes = (seconds % 3600) // 60
-    secs = seconds % 60
+    minutes, secs = divmod(ms // 1000, 60)
+    hours, minutes = divmod(minutes, 60)
     
     if hours > 0:
         return f"{hours}:{minutes:02d}:{secs:02d}"
     return f"{minutes}:{secs:02d}"
 
+@njit(cache=True)
+def assign_chunk_ids(start_ms, chunk_duration_ms):
+    """Chunk index per segment: a new chunk starts once a segment is past the window."""
+    chunk_ids = np.empty(start_ms.size, dtype=np.int64)
+    chunk_id = 0
+    chunk_start = start_ms[0] if start_ms.size else 0
+    for i in range(start_ms.size):
+        if i > 0 and start_ms[i] - chunk_start > chunk_duration_ms:
+            chunk_id += 1
+            chunk_start = start_ms[i]
+        chunk_ids[i] = chunk_id
+    return chunk_ids
+
 def combine_segments_into_chunks(segments, chunk_duration_ms=120000):
     """Combine segments into larger chunks for analysis (default 2 minutes for more context)."""
     if not segments:
         return []
     
-    chunks = []
-    current_chunk = {
-        'start_ms': segments[0]['start_ms'],
-        'start_time': segments[0]['start_time'],
-        'texts': [],
-        'segment_times': []  # Track individual segment timestamps
-    }
-    
-    for seg in segments:
-        if seg['start_ms'] - current_chunk['start_ms'] > chunk_duration_ms and current_chunk['texts']:
-            current_chunk['text'] = ' '.join(current_chunk['texts'])
-            chunks.append(current_chunk)
-            current_chunk = {
-                'start_ms': seg['start_ms'],
-                'start_time': seg['start_time'],
-                'texts': [],
-                'segment_times': []
-            }
-        
-        current_chunk['texts'].append(seg['text'])
-        current_chunk['segment_times'].append({
-            'ms': seg['start_ms'],
-            'time': seg['start_time'],
-            'text': seg['text']
-        })
+    start_ms = np.fromiter((seg['start_ms'] for seg in segments), dtype=np.int64, count=len(segments))
+    chunk_ids = assign_chunk_ids(start_ms, chunk_duration_ms)
+    bounds = [0, *(np.flatnonzero(np.diff(chunk_ids)) + 1).tolist(), len(segments)]
     
-    if current_chunk['texts']:
-        current_chunk['text'] = ' '.join(current_chunk['texts'])
-        chunks.append(current_chunk)
+    chunks = []
+    for lo, hi in zip(bounds, bounds[1:]):
+        segs = segments[lo:hi]
+        texts = [seg['text'] for seg in segs]
+        chunk = {
+            'start_ms': segs[0]['start_ms'],
+            'start_time': segs[0]['start_time'],
+            'texts': texts,
+            'segment_times': [
+                {'ms': seg['start_ms'], 'time': seg['start_time'], 'text': seg['text']}
+                for seg in segs
+            ],  # Track individual segment timestamps
+            'text': ' '.join(texts)
+        }
+        index_chunk_segments(chunk)
+        chunks.append(chunk)
     
     return chunks
 
+# Literal phrases (alternations expanded) so one Aho-Corasick pass finds any of them
+ILLUSTRATION_MARKERS = (
+    "let me tell you",
+    "i remember when",
+    "remember when",
+    *(f"there was a {w}" for w in ("man", "woman", "boy", "girl", "guy", "lady", "person")),
+    *(f"i was {w}" for w in ("talking", "speaking", "praying", "thinking")),
+    "years ago",
+    "one time",
+    "story about",
+    "reminds me of",
+    "picture this",
+    "imagine",
+    "for example",
+    "illustration",
+    *(f"my {w}" for w in ("wife", "son", "daughter", "friend", "dad", "mom", "father", "mother")),
+    *(f"becky {w}" for w in ("and i", "told me", "said")),
+    *(f"when i was {w}" for w in ("young", "a kid", "growing up")),
+    "c.s. lewis",
+    "someone once said",
+    "funny story",
+    "true story",
+)
+
+_MARKER_AUTOMATON = ahocorasick.Automaton()
+for _marker in ILLUSTRATION_MARKERS:
+    _MARKER_AUTOMATON.add_word(_marker, _marker)
+_MARKER_AUTOMATON.make_automaton()
+
 def find_illustration_markers(text):
     """Look for phrases that typically introduce illustrations/stories."""
-    markers = [
-        r"let me tell you",
-        r"i remember when",
-        r"remember when",
-        r"there was a (man|woman|boy|girl|guy|lady|person)",
-        r"i was (talking|speaking|praying|thinking)",
-        r"years ago",
-        r"one time",
-        r"story about",
-        r"reminds me of",
-        r"picture this",
-        r"imagine",
-        r"for example",
-        r"illustration",
-        r"my (wife|son|daughter|friend|dad|mom|father|mother)",
-        r"becky (and i|told me|said)",
-        r"when i was (young|a kid|growing up)",
-        r"c\.s\. lewis",
-        r"someone once said",
-        r"(funny|true) story",
-    ]
-    
-    text_lower = text.lower()
-    for marker in markers:
-        if re.search(marker, text_lower):
-            return True
-    return False
+    return next(_MARKER_AUTOMATON.iter(text.lower()), None) is not None
+
+# Story-starting markers, searched as one pattern over a chunk's joined segment text
+START_MARKERS = (
+    'let me tell you', 'i remember', 'there was', 'one time', 'years ago',
+    'picture this', 'imagine', 'for example', 'my wife', 'my son', 'my daughter',
+    'becky and i', 'when i was', 'story', 'reminds me', 'i was talking',
+    'someone once said', 'c.s. lewis'
+)
+_START_MARKERS_RE = re.compile('|'.join(re.escape(m) for m in START_MARKERS))
+
+def index_chunk_segments(chunk):
+    """
+    Join the chunk's lowercased segment texts with NUL separators and record each
+    segment's start offset, so a match position maps back to a segment via bisect.
+    Needles never contain NUL, so a hit always lies inside a single segment.
+    """
+    lowered = [seg['text'].lower() for seg in chunk['segment_times']]
+    offsets = []
+    pos = 0
+    for text in lowered:
+        offsets.append(pos)
+        pos += len(text) + 1
+    chunk['joined_lower'] = '\0'.join(lowered)
+    chunk['offsets'] = offsets
 
 def find_illustration_start_timestamp(chunk, opening_phrase, full_text):
     """
@@ -141,46 +189,92 @@ def find_illustration_start_timestamp(chunk, opening_phrase, full_text):
     if not chunk.get('segment_times'):
         return chunk['start_ms'], chunk['start_time']
     
-    opening_lower = opening_phrase.lower() if opening_phrase else ''
-    text_lower = full_text.lower()[:100] if full_text else ''  # First 100 chars of quote
-    
-    # Story-starting markers to look for
-    start_markers = [
-        'let me tell you', 'i remember', 'there was', 'one time', 'years ago',
-        'picture this', 'imagine', 'for example', 'my wife', 'my son', 'my daughter',
-        'becky and i', 'when i was', 'story', 'reminds me', 'i was talking',
-        'someone once said', 'c.s. lewis'
-    ]
-    
-    best_match_ms = chunk['start_ms']
-    best_match_time = chunk['start_time']
-    
-    for seg_info in chunk['segment_times']:
-        seg_text = seg_info['text'].lower()
-        
-        # Check if opening phrase is in this segment
-        if opening_lower and opening_lower[:30] in seg_text:
-            return seg_info['ms'], seg_info['time']
-        
-        # Check if start of the quote text is in this segment
-        if text_lower[:50] and text_lower[:50] in seg_text:
-            return seg_info['ms'], seg_info['time']
-        
-        # Check for story-starting markers
-        for marker in start_markers:
-            if marker in seg_text:
-                best_match_ms = seg_info['ms']
-                best_match_time = seg_info['time']
-                break
-    
-    return best_match_ms, best_match_time
+    segment_times = chunk['segment_times']
+    joined = chunk['joined_lower']
+    offsets = chunk['offsets']
+    
+    opening_lower = opening_phrase.lower()[:30] if opening_phrase else ''
+    text_lower = full_text.lower()[:50] if full_text else ''  # Start of the quote
+    
+    # Earliest segment containing the opening phrase or the start of the quote
+    hits = [joined.find(needle) for needle in (opening_lower, text_lower) if needle]
+    hits = [pos for pos in hits if pos >= 0]
+    if hits:
+        seg_info = segment_times[bisect_right(offsets, min(hits)) - 1]
+        return seg_info['ms'], seg_info['time']
+    
+    # Otherwise the last segment with a story-starting marker
+    last = None
+    for last in _START_MARKERS_RE.finditer(joined):
+        pass
+    if last is not None:
+        seg_info = segment_times[bisect_right(offsets, last.start()) - 1]
+        return seg_info['ms'], seg_info['time']
+    
+    return chunk['start_ms'], chunk['start_time']
 
-async def analyze_chunk_with_ai(chunk_text, video_id, chunk, all_segments):
-    """Use AI to analyze a text chunk and extract illustrations with opening phrases."""
-    if not XAI_API_KEY:
-        return []
-    
-    prompt = f"""Analyze this sermon transcript segment from Pastor Bob Kopeny. 
+EMBED_MODEL_NAME = 'all-MiniLM-L6-v2'
+_embed_model = None
+_illustration_centroid = None  # unit-length mean embedding of known illustrations
+
+def load_illustration_filter(output_dir):
+    """
+    Build the "looks like an illustration" centroid from previously extracted
+    illustrations. With nothing to learn from yet, every marker hit goes to the AI.
+    """
+    global _embed_model, _illustration_centroid
+    texts = []
+    for name in ('illustrations_v2.json', 'illustrations.json'):
+        path = Path(output_dir) / name
+        if path.exists():
+            with open(path, 'rb') as f:
+                texts = [ill['text'] for ill in orjson.loads(f.read()) if ill.get('text')]
+            break
+    if not texts:
+        print("No existing illustrations; embedding pre-filter disabled for this run")
+        return
+    
+    from sentence_transformers import SentenceTransformer
+    _embed_model = SentenceTransformer(EMBED_MODEL_NAME)
+    embs = _embed_model.encode(texts, batch_size=32, normalize_embeddings=True)
+    centroid = embs.mean(axis=0)
+    _illustration_centroid = centroid / np.linalg.norm(centroid)
+    print(f"Embedding pre-filter built from {len(texts)} known illustrations")
+
+def filter_by_embedding(candidate_chunks, threshold):
+    """Drop candidates whose embedding is far from the known-illustration centroid."""
+    if _embed_model is None or threshold <= 0 or not candidate_chunks:
+        return candidate_chunks
+    embs = _embed_model.encode([c['text'] for c in candidate_chunks], batch_size=32, normalize_embeddings=True)
+    sims = embs @ _illustration_centroid
+    return [chunk for chunk, sim in zip(candidate_chunks, sims) if sim >= threshold]
+
+AI_CACHE_DIR = 'ai_cache'
+_ai_cache = {}  # sha256(chunk text) -> raw JSON content from the model
+_ai_cache_file = None
+
+def load_ai_cache(output_dir):
+    """Load cached AI responses from output_dir/ai_cache/responses.jsonl (append-only)."""
+    global _ai_cache_file
+    cache_dir = Path(output_dir) / AI_CACHE_DIR
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    _ai_cache_file = cache_dir / 'responses.jsonl'
+    if _ai_cache_file.exists():
+        with open(_ai_cache_file, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    entry = orjson.loads(line)
+                    _ai_cache[entry['key']] = entry['response']
+    print(f"Loaded {len(_ai_cache)} cached AI responses")
+
+def cache_ai_response(key, content):
+    _ai_cache[key] = content
+    if _ai_cache_file:
+        with open(_ai_cache_file, 'ab') as f:
+            f.write(orjson.dumps({'key': key, 'response': content}) + b'\n')
+
+# The analysis prompt is fixed around the chunk texts; built once, not per call
+PROMPT_PREFIX = """Analyze these numbered sermon transcript chunks from Pastor Bob Kopeny. 
 Look for illustrations, stories, personal anecdotes, quotes, or examples he uses to make a point.
 
 For EACH illustration found, extract:
@@ -189,6 +283,7 @@ For EACH illustration found, extract:
 3. The key quote (1-3 sentences from the illustration, cleaned up for clarity)
 4. All topics it could apply to (be generous - list 5-10 topics)
 5. The tone (one of: comforting, funny, raw, challenging, warm, sobering, inspiring, convicting)
+6. The chunk_id: the number of the CHUNK it comes from
 
 IMPORTANT: 
 - Only extract ACTUAL illustrations/stories/examples, not general teaching
@@ -196,88 +291,155 @@ IMPORTANT:
 - Clean up filler words but keep Pastor Bob's natural speaking style
 - If no illustrations are found, return empty array []
 
-Transcript segment:
----
-{chunk_text}
----
+Transcript chunks:
+"""
+PROMPT_SUFFIX = """---
 
 Return ONLY a JSON array (no markdown, no explanation):
 [
-  {{
+  {
+    "chunk_id": 1,
     "illustration": "Title Here",
     "opening_phrase": "Let me tell you about...",
     "text": "The cleaned up quote from the illustration...",
     "topics": ["topic1", "topic2", ...],
     "tone": "tone_here"
-  }}
+  }
 ]
 
 If no illustrations found, return: []"""
 
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                'https://api.x.ai/v1/chat/completions',
-                headers={
-                    'Content-Type': 'application/json',
-                    'Authorization': f'Bearer {XAI_API_KEY}'
-                },
-                json={
-                    'model': 'grok-3',
-                    'messages': [{'role': 'user', 'content': prompt}],
-                    'temperature': 0.3,
-                    'max_tokens': 2000
-                },
-                timeout=aiohttp.ClientTimeout(total=45)
-            ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    content = data['choices'][0]['message']['content'].strip()
-                    
-                    if content.startswith('```'):
-                        content = re.sub(r'^```json?\n?', '', content)
-                        content = re.sub(r'\n?```$', '', content)
-                    
-                    illustrations = json.loads(content)
-                    
-                    # Find actual timestamp for each illustration
-                    for ill in illustrations:
-                        opening = ill.get('opening_phrase', '')
-                        text = ill.get('text', '')
-                        
-                        start_ms, start_time = find_illustration_start_timestamp(
-                            chunk, opening, text
-                        )
-                        
-                        ill['timestamp'] = start_time
-                        ill['video_url'] = f"https://www.youtube.com/watch?v={video_id}&t={start_ms // 1000}s"
-                        ill['video_id'] = video_id
-                        
-                        # Remove opening_phrase from final output (we just used it for timestamp finding)
-                        if 'opening_phrase' in ill:
-                            del ill['opening_phrase']
-                    
-                    return illustrations
-                else:
-                    print(f"API error: {response.status}")
-                    return []
-    except Exception as e:
-        print(f"Error calling AI: {e}")
-        return []
+# Candidate chunks sent together in one request
+CHUNKS_PER_REQUEST = 4
+
+MIN_CHUNK_CHARS = 400
+
+XAI_HEADERS = {
+    'Content-Type': 'application/json',
+    'Authorization': f'Bearer {XAI_API_KEY}'
+}
+
+def is_valid_illustration(ill):
+    """Cheap shape check on a model-produced item before it enters the pipeline."""
+    return isinstance(ill, dict) and isinstance(ill.get('text'), str) and isinstance(ill.get('topics'), list)
+
+def decorate_illustrations(illustrations, video_id, url_prefix, chunk):
+    """Attach video info and the actual start timestamp to a chunk's illustrations."""
+    # Find actual timestamp for each illustration
+    for ill in illustrations:
+        opening = ill.get('opening_phrase', '')
+        text = ill.get('text', '')
+        
+        start_ms, start_time = find_illustration_start_timestamp(
+            chunk, opening, text
+        )
+        
+        ill['timestamp'] = start_time
+        ill['video_url'] = url_prefix + str(start_ms // 1000) + 's'
+        ill['video_id'] = video_id
+        
+        # Remove opening_phrase from final output (we just used it for timestamp finding)
+        if 'opening_phrase' in ill:
+            del ill['opening_phrase']
+    
+    return illustrations
+
+async def request_illustrations(session, chunks):
+    """POST one prompt covering `chunks`; returns the model's JSON text or None."""
+    prompt = PROMPT_PREFIX + ''.join(
+        f"---CHUNK {n} (start={chunk['start_time']})---\n{chunk['text']}\n"
+        for n, chunk in enumerate(chunks, 1)
+    ) + PROMPT_SUFFIX
+    body = orjson.dumps({
+        'model': 'grok-3',
+        'messages': [{'role': 'user', 'content': prompt}],
+        'temperature': 0.3,
+        'max_tokens': 2000 * len(chunks)
+    })
+    async with session.post(
+        'https://api.x.ai/v1/chat/completions',
+        data=body,
+        headers=XAI_HEADERS,
+        timeout=aiohttp.ClientTimeout(total=45 * len(chunks))
+    ) as response:
+        if response.status != 200:
+            print(f"API error: {response.status}")
+            return None
+        data = orjson.loads(await response.read())
+    content = data['choices'][0]['message']['content'].strip()
+    
+    # Handle potential markdown wrapping
+    if content.startswith('```'):
+        content = content.removeprefix('```json').removeprefix('```').strip()
+        content = content.removesuffix('```').strip()
+    return content
+
+async def analyze_chunks_with_ai(session, chunks, video_id, url_prefix):
+    """Use AI to extract illustrations (with opening phrases) from several chunks in one request; one list per chunk."""
+    results = [[] for _ in chunks]
+    if not XAI_API_KEY:
+        return results
+    
+    pending = []  # (index, cache key) of chunks that still need the model
+    for i, chunk in enumerate(chunks):
+        chunk_text = chunk['text']
+        
+        # Too short to hold a real story; not worth a round trip
+        if len(chunk_text) < MIN_CHUNK_CHARS:
+            print(f"    Skipping short chunk ({len(chunk_text)} chars)")
+            continue
+        
+        # Identical chunk text (re-uploaded sermons) reuses the earlier model response
+        key = hashlib.sha256(chunk_text.encode()).hexdigest()
+        content = _ai_cache.get(key)
+        if content is None:
+            pending.append((i, key))
+        else:
+            results[i] = [ill for ill in orjson.loads(content) if is_valid_illustration(ill)]
+    
+    if pending:
+        try:
+            content = await request_illustrations(session, [chunks[i] for i, _ in pending])
+            if content is not None:
+                # Demultiplex by chunk_id, then cache each chunk's share on its own
+                by_chunk = [[] for _ in pending]
+                dropped = 0
+                for ill in orjson.loads(content):
+                    n = str(ill.pop('chunk_id', '')) if is_valid_illustration(ill) else ''
+                    if n.isdigit() and 1 <= int(n) <= len(pending):
+                        by_chunk[int(n) - 1].append(ill)
+                    else:
+                        dropped += 1
+                for (i, key), illustrations in zip(pending, by_chunk):
+                    # An empty share is only trustworthy if nothing in the response was dropped;
+                    # otherwise its stories may be among the unattributable items
+                    if illustrations or not dropped:
+                        cache_ai_response(key, orjson.dumps(illustrations).decode())
+                    results[i] = illustrations
+        except Exception as e:
+            print(f"Error calling AI: {e}")
+    
+    return [decorate_illustrations(ills, video_id, url_prefix, chunk) for ills, chunk in zip(results, chunks)]
 
-async def process_sermon_file(filepath, output_dir):
+def parse_and_chunk(filepath, chunk_duration_ms):
+    """Parse a JSON3 file and chunk it; top-level so it can run in a worker process."""
+    video_id, segments = parse_json3_file(filepath)
+    if not segments:
+        return video_id, segments, []
+    return video_id, segments, combine_segments_into_chunks(segments, chunk_duration_ms=chunk_duration_ms)
+
+async def process_sermon_file(session, pool, filepath, output_dir, semaphore, embed_threshold, chunks_per_request):
     """Process a single sermon JSON3 file and extract illustrations."""
     print(f"Processing: {Path(filepath).name}")
     
-    video_id, segments = parse_json3_file(filepath)
+    # Parse and use larger chunks (2 minutes) for better context, off the event loop
+    loop = asyncio.get_running_loop()
+    video_id, segments, chunks = await loop.run_in_executor(pool, parse_and_chunk, filepath, 120000)
     if not segments:
         print(f"  No segments found")
         return []
     
     print(f"  Found {len(segments)} segments")
-    
-    # Use larger chunks (2 minutes) for better context
-    chunks = combine_segments_into_chunks(segments, chunk_duration_ms=120000)
     print(f"  Created {len(chunks)} chunks for analysis")
     
     all_illustrations = []
@@ -290,20 +452,30 @@ async def process_sermon_file(filepath, output_dir):
     
     print(f"  Found {len(candidate_chunks)} candidate chunks with illustration markers")
     
-    # Analyze candidate chunks with AI
-    for i, chunk in enumerate(candidate_chunks):
-        print(f"    Analyzing chunk {i+1}/{len(candidate_chunks)}...")
-        illustrations = await analyze_chunk_with_ai(
-            chunk['text'], 
-            video_id, 
-            chunk,
-            segments
-        )
-        if illustrations:
-            print(f"      Found {len(illustrations)} illustration(s)")
-            all_illustrations.extend(illustrations)
-        
-        await asyncio.sleep(0.5)
+    # Cheap local check before paying for the AI call (batch-encoded, off the event loop)
+    kept = await asyncio.to_thread(filter_by_embedding, candidate_chunks, embed_threshold)
+    if len(kept) < len(candidate_chunks):
+        print(f"  Embedding filter skipped {len(candidate_chunks) - len(kept)} chunk(s)")
+    candidate_chunks = kept
+    
+    # Analyze candidate chunks with AI, several per request and up to `semaphore` requests in flight
+    url_prefix = f"https://www.youtube.com/watch?v={video_id}&t="  # constant per sermon
+    batches = [
+        candidate_chunks[i:i + chunks_per_request]
+        for i in range(0, len(candidate_chunks), chunks_per_request)
+    ]
+    
+    async def _run(b, batch):
+        async with semaphore:
+            print(f"    Analyzing batch {b+1}/{len(batches)} ({len(batch)} chunks)...")
+            return await analyze_chunks_with_ai(session, batch, video_id, url_prefix)
+    
+    results = await asyncio.gather(*[_run(b, batch) for b, batch in enumerate(batches)])
+    for batch_results in results:
+        for illustrations in batch_results:
+            if illustrations:
+                print(f"      Found {len(illustrations)} illustration(s)")
+                all_illustrations.extend(illustrations)
     
     return all_illustrations
 
@@ -312,6 +484,10 @@ async def main():
     parser.add_argument('--input', '-i', required=True, help='Input directory with JSON3 files')
     parser.add_argument('--output', '-o', default='./illustrations', help='Output directory')
     parser.add_argument('--limit', '-l', type=int, default=0, help='Limit number of files to process (0=all)')
+    parser.add_argument('--concurrency', '-c', type=int, default=8, help='Max concurrent AI requests')
+    parser.add_argument('--file-concurrency', type=int, default=4, help='Max sermon files processed at once')
+    parser.add_argument('--batch-size', type=int, default=CHUNKS_PER_REQUEST, help='Candidate chunks per AI request')
+    parser.add_argument('--embed-threshold', type=float, default=0.35, help='Min cosine to the known-illustration centroid (0=off)')
     parser.add_argument('--append', '-a', action='store_true', help='Append to existing illustrations file')
     args = parser.parse_args()
     
@@ -320,17 +496,22 @@ async def main():
         print("Set it with: export XAI_API_KEY='your-key-here'")
         sys.exit(1)
     
+    semaphore = asyncio.Semaphore(args.concurrency)
+    
     input_dir = Path(args.input)
     output_dir = Path(args.output)
     output_dir.mkdir(parents=True, exist_ok=True)
+    load_ai_cache(output_dir)
+    if args.embed_threshold > 0:
+        load_illustration_filter(output_dir)
     
     # Load existing illustrations if appending
     all_illustrations = []
     if args.append:
         existing_file = output_dir / 'illustrations.json'
         if existing_file.exists():
-            with open(existing_file, 'r') as f:
-                all_illustrations = json.load(f)
+            with open(existing_file, 'rb') as f:
+                all_illustrations = orjson.loads(f.read())
             print(f"Loaded {len(all_illustrations)} existing illustrations")
     
     # Find all JSON3 files
@@ -341,34 +522,56 @@ async def main():
         json3_files = json3_files[:args.limit]
         print(f"Processing first {args.limit} files")
     
-    for filepath in json3_files:
-        illustrations = await process_sermon_file(filepath, output_dir)
-        all_illustrations.extend(illustrations)
+    file_semaphore = asyncio.Semaphore(args.file_concurrency)
+    
+    async def _process(filepath):
+        async with file_semaphore:
+            illustrations = await process_sermon_file(
+                session, pool, filepath, output_dir, semaphore, args.embed_threshold, args.batch_size
+            )
         
-        # Save progress periodically
-        if len(all_illustrations) > 0 and len(all_illustrations) % 50 == 0:
-            progress_file = output_dir / 'illustrations_v2_progress.json'
-            with open(progress_file, 'w') as f:
-                json.dump(all_illustrations, f, indent=2)
+        # Append-only progress log: one illustration per line, nothing rewritten
+        for ill in illustrations:
+            progress_log.write(orjson.dumps(ill) + b'\n')
+        progress_log.flush()
+        return illustrations
+    
+    # CPU-bound JSON3 parsing/chunking runs in worker processes; AI calls stay on the loop.
+    # Workers are spawned, not forked: the embedding pre-filter may have started torch's thread pool.
+    pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context('spawn'))
+    with pool, open(output_dir / 'illustrations_v2_progress.jsonl', 'ab') as progress_log:
+        # One pooled keep-alive session for every x.ai call
+        async with aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=16, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=45)
+        ) as session:
+            results = await asyncio.gather(*[_process(filepath) for filepath in json3_files])
+    
+    for illustrations in results:
+        all_illustrations.extend(illustrations)
     
-    # Save final results
+    # Save final results via a temp file, so a crash never leaves it truncated
     output_file = output_dir / 'illustrations_v2.json'
-    with open(output_file, 'w') as f:
-        json.dump(all_illustrations, f, indent=2)
+    tmp_file = output_file.with_suffix('.json.tmp')
+    with open(tmp_file, 'wb') as f:
+        f.write(orjson.dumps(all_illustrations, option=orjson.OPT_INDENT_2))
+    os.replace(tmp_file, output_file)
     
     print(f"\n{'='*50}")
     print(f"COMPLETE: Found {len(all_illustrations)} total illustrations")
     print(f"Saved to: {output_file}")
     
     # Print summary by topic
-    topic_counts = {}
+    topic_counts = Counter()
     for ill in all_illustrations:
-        for topic in ill.get('topics', []):
-            topic_counts[topic] = topic_counts.get(topic, 0) + 1
+        topic_counts.update(ill.get('topics', []))
     
     print(f"\nTop topics:")
-    for topic, count in sorted(topic_counts.items(), key=lambda x: -x[1])[:20]:
+    for topic, count in topic_counts.most_common(20):
         print(f"  {topic}: {count}")
 
 if __name__ == '__main__':
+    # libuv-backed loop when available; the script is dominated by aiohttp I/O
+    if uvloop is not None:
+        uvloop.install()
     asyncio.run(main())
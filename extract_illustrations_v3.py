@@ -12,17 +12,30 @@ Usage:
 """
 
 import os
+import pickle
 import sys
 import json
 import re
 import asyncio
+import hashlib
 import aiohttp
+import orjson
+from aiolimiter import AsyncLimiter
+try:
+    import ijson
+except ImportError:
+    ijson = None
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
 
 load_dotenv()
 
 XAI_API_KEY = os.environ.get('XAI_API_KEY')
+
+# Client-side pacing keeps requests under the x.ai quota instead of reacting to 429s
+XAI_RPS = float(os.environ.get('XAI_RPS', '8'))
+LIMITER = AsyncLimiter(max_rate=XAI_RPS, time_period=1)
 CHROMA_API_KEY = os.environ.get('CHROMA_API_KEY', 'ck-Ci7fQVMx8Q6nENxr8daGNYYNj22wmTazd9hXkAPWNVPd')
 CHROMA_TENANT = os.environ.get('CHROMA_TENANT', '4b12a7c7-2fb4-4edc-9b6e-c2a77305136b')
 CHROMA_DATABASE = os.environ.get('CHROMA_DATABASE', 'APB')
@@ -33,8 +46,21 @@ TRANSCRIPT_DIRS = [
 ]
 
 PROGRESS_FILE = './illustrations_v3_progress.json'
+PROGRESS_LOG = './illustrations_v3_progress.jsonl'  # one line per finished video, append-only
+CHUNK_CACHE_FILE = './illustrations_v3_chunk_cache.jsonl'  # chunk text hash -> illustrations, append-only
+CHUNKS_CACHE_DIR = Path('./.chunks_cache_v3')  # chunked transcripts of videos not yet finished
 OUTPUT_FILE = './illustrations_v3.json'
 
+# Caption events that carry no sermon text
+_SKIP_TEXTS = frozenset(('[Music]', '[Applause]', '\n', ''))
+
+# Markdown fences the model sometimes wraps its JSON in
+_FENCE_OPEN = re.compile(r'^```json?\n?')
+_FENCE_CLOSE = re.compile(r'\n?```$')
+
+# Chunks sent together in one Grok request
+CHUNKS_PER_REQUEST = 4
+
 EXTRACTION_PROMPT = """You are analyzing a sermon transcript from Pastor Bob Kopeny.
 Find ILLUSTRATIONS - these are specific types of content that bring a teaching point to life:
 
@@ -53,7 +79,7 @@ WHAT DOES NOT COUNT (EXCLUDE these):
 - Transitions between topics
 - Greetings, announcements, prayer requests
 
-Transcript segment:
+Transcript chunks:
 ---
 {text}
 ---
@@ -69,34 +95,41 @@ For EACH illustration found, return:
   "tone": "comforting|funny|raw|challenging|warm|sobering|inspiring|convicting"
 }}
 
-Return ONLY a JSON array. If no true illustrations found, return [].
+Return ONLY a JSON array of arrays, one inner array per CHUNK in order (e.g. [[...], [], [...]]).
+Use [] for a chunk with no true illustrations.
 Be STRICT - only include genuine stories, examples, quotes-with-context, or analogies.
 Do NOT include general teaching passages."""
 
-def parse_json3_file(filepath):
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-    except Exception as e:
-        return None, None
+def iter_json3_events(filepath):
+    """Stream transcript events one at a time (ijson), or parse the file whole with orjson."""
+    with open(filepath, 'rb') as f:
+        if ijson is not None:
+            yield from ijson.items(f, 'events.item', use_float=True)
+        else:
+            yield from orjson.loads(f.read()).get('events', [])
 
+def parse_json3_file(filepath):
     video_id = Path(filepath).stem.replace('.en', '')
-    events = data.get('events', [])
 
     segments = []
-    for event in events:
-        if 'segs' in event:
-            start_ms = event.get('tStartMs', 0)
-            text_parts = []
-            for seg in event['segs']:
-                if 'utf8' in seg:
-                    text_parts.append(seg['utf8'])
-            text = ''.join(text_parts).strip()
-            if text and text not in ['[Music]', '[Applause]', '\n']:
-                segments.append({
-                    'start_ms': start_ms,
-                    'text': text
-                })
+    try:
+        for event in iter_json3_events(filepath):
+            if 'segs' in event:
+                start_ms = event.get('tStartMs', 0)
+                text_parts = []
+                for seg in event['segs']:
+                    if 'utf8' in seg:
+                        text_parts.append(seg['utf8'])
+                if not text_parts:
+                    continue
+                text = ''.join(text_parts).strip()
+                if text not in _SKIP_TEXTS:
+                    segments.append({
+                        'start_ms': start_ms,
+                        'text': text
+                    })
+    except Exception:
+        return None, None
 
     return video_id, segments
 
@@ -121,7 +154,7 @@ def combine_into_chunks(segments, chunk_ms=180000):
             chunks.append(current)
             current = {'start_ms': seg['start_ms'], 'texts': [], 'seg_times': []}
         current['texts'].append(seg['text'])
-        current['seg_times'].append({'ms': seg['start_ms'], 'text': seg['text']})
+        current['seg_times'].append({'ms': seg['start_ms'], 'text': seg['text'], 'text_lower': seg['text'].lower()})
 
     if current['texts']:
         current['text'] = ' '.join(current['texts'])
@@ -134,92 +167,215 @@ def find_timestamp_for_phrase(chunk, phrase):
         return chunk['start_ms']
     phrase_lower = phrase.lower()[:40]
     for seg in chunk['seg_times']:
-        if phrase_lower in seg['text'].lower():
+        if phrase_lower in seg['text_lower']:
             return seg['ms']
     return chunk['start_ms']
 
-async def analyze_chunk(chunk_text, semaphore, retry=0):
+def format_chunks(chunks):
+    return '\n\n'.join(f"CHUNK {n}:\n{c['text'][:3000]}" for n, c in enumerate(chunks, 1))
+
+def split_per_chunk(result, n):
+    """Model output -> one illustration list per chunk (None where missing), or None if not an array of arrays."""
+    if not isinstance(result, list):
+        return None
+    if not all(isinstance(r, list) for r in result):
+        if n == 1:
+            return [result]  # a single chunk answered with a flat array
+        return None  # can't tell which chunk a flat array belongs to
+    per_chunk = result[:n]
+    return per_chunk + [None] * (n - len(per_chunk))
+
+async def request_chunks(session, chunks, semaphore, retry=0):
+    """One Grok request covering several chunks; one illustration list per chunk, or None on failure."""
     async with semaphore:
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    'https://api.x.ai/v1/chat/completions',
-                    headers={
-                        'Content-Type': 'application/json',
-                        'Authorization': f'Bearer {XAI_API_KEY}'
-                    },
-                    json={
-                        'model': 'grok-3-mini-fast',
-                        'messages': [{'role': 'user', 'content': EXTRACTION_PROMPT.format(text=chunk_text[:3000])}],
-                        'temperature': 0.2,
-                        'max_tokens': 2000
-                    },
-                    timeout=aiohttp.ClientTimeout(total=45)
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        content = data['choices'][0]['message']['content'].strip()
-                        if content.startswith('```'):
-                            content = re.sub(r'^```json?\n?', '', content)
-                            content = re.sub(r'\n?```$', '', content)
-                        return json.loads(content)
-                    elif response.status == 429:
-                        wait = min(2 ** retry * 2, 30)
-                        await asyncio.sleep(wait)
-                        if retry < 5:
-                            return await analyze_chunk(chunk_text, semaphore, retry + 1)
-                    else:
-                        err = await response.text()
-                        print(f"    API error {response.status}: {err[:80]}")
-        except json.JSONDecodeError:
+            await LIMITER.acquire()
+            async with session.post(
+                'https://api.x.ai/v1/chat/completions',
+                headers={
+                    'Content-Type': 'application/json',
+                    'Authorization': f'Bearer {XAI_API_KEY}'
+                },
+                json={
+                    'model': 'grok-3-mini-fast',
+                    'messages': [{'role': 'user', 'content': EXTRACTION_PROMPT.format(text=format_chunks(chunks))}],
+                    'temperature': 0.2,
+                    'max_tokens': 2000 * len(chunks)
+                },
+                timeout=aiohttp.ClientTimeout(total=45 * len(chunks))
+            ) as response:
+                if response.status == 200:
+                    data = orjson.loads(await response.read())
+                    content = data['choices'][0]['message']['content'].strip()
+                    if content.startswith('```'):
+                        content = _FENCE_OPEN.sub('', content)
+                        content = _FENCE_CLOSE.sub('', content)
+                    per_chunk = split_per_chunk(orjson.loads(content), len(chunks))
+                    if per_chunk is None:
+                        print(f"    Unexpected response shape for {len(chunks)} chunks, not caching")
+                    return per_chunk
+                elif response.status == 429:
+                    wait = min(2 ** retry * 2, 30)
+                    await asyncio.sleep(wait)
+                    if retry < 5:
+                        return await request_chunks(session, chunks, semaphore, retry + 1)
+                else:
+                    err = await response.text()
+                    print(f"    API error {response.status}: {err[:80]}")
+        except orjson.JSONDecodeError:
             pass
         except Exception as e:
             if retry < 3:
                 await asyncio.sleep(2)
-                return await analyze_chunk(chunk_text, semaphore, retry + 1)
-    return []
+                return await request_chunks(session, chunks, semaphore, retry + 1)
+    return None
+
+CHUNK_CACHE = {}  # sha256 of the chunk text sent -> serialized illustration list
+
+def chunk_key(chunk):
+    return hashlib.sha256(chunk['text'][:3000].encode()).hexdigest()
+
+def load_chunk_cache():
+    if os.path.exists(CHUNK_CACHE_FILE):
+        with open(CHUNK_CACHE_FILE, 'rb') as f:
+            for line in f:
+                try:
+                    entry = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    continue
+                CHUNK_CACHE[entry['key']] = orjson.dumps(entry['illustrations'])
+
+def cache_chunk_result(key, illustrations):
+    CHUNK_CACHE[key] = orjson.dumps(illustrations)
+    with open(CHUNK_CACHE_FILE, 'ab') as f:
+        f.write(orjson.dumps({'key': key, 'illustrations': illustrations}) + b'\n')
+
+async def analyze_chunks(session, chunks, semaphore):
+    """One illustration list per chunk; repeated chunk text is served from CHUNK_CACHE."""
+    results = [[] for _ in chunks]
+    pending = []
+    for i, chunk in enumerate(chunks):
+        key = chunk_key(chunk)
+        cached = CHUNK_CACHE.get(key)
+        if cached is None:
+            pending.append((i, key))
+        else:
+            results[i] = orjson.loads(cached)
+
+    if pending:
+        fresh = await request_chunks(session, [chunks[i] for i, _ in pending], semaphore)
+        if fresh is not None:
+            for (i, key), illustrations in zip(pending, fresh):
+                if illustrations is None:
+                    continue  # model skipped this chunk; leave it uncached for a later run
+                cache_chunk_result(key, illustrations)
+                results[i] = illustrations
+    return results
 
 def load_progress():
     if os.path.exists(PROGRESS_FILE):
         with open(PROGRESS_FILE, 'r') as f:
-            return json.load(f)
-    return {'processed_videos': [], 'illustrations': []}
+            progress = json.load(f)
+    else:
+        progress = {'processed_videos': [], 'illustrations': []}
+
+    # Replay videos finished since the last full save
+    if os.path.exists(PROGRESS_LOG):
+        done = set(progress['processed_videos'])
+        with open(PROGRESS_LOG, 'rb') as f:
+            for line in f:
+                try:
+                    entry = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    continue  # torn write from a crash; that video is simply redone
+                if entry['video_id'] not in done:
+                    done.add(entry['video_id'])
+                    progress['processed_videos'].append(entry['video_id'])
+                    progress['illustrations'].extend(entry['illustrations'])
+    return progress
 
 def save_progress(progress):
     with open(PROGRESS_FILE, 'w') as f:
         json.dump(progress, f, indent=2)
-
-async def process_video(filepath, semaphore):
+    # Everything in the log is now in the full save
+    if os.path.exists(PROGRESS_LOG):
+        os.remove(PROGRESS_LOG)
+
+def append_progress(video_id, illustrations):
+    with open(PROGRESS_LOG, 'ab') as f:
+        f.write(orjson.dumps({'video_id': video_id, 'illustrations': illustrations}) + b'\n')
+    # A finished video is never parsed again, so its cached chunks can go
+    (CHUNKS_CACHE_DIR / f'{video_id}.pkl').unlink(missing_ok=True)
+
+def load_cached_chunks(filepath, video_id):
+    """Chunks saved by an earlier run, unless the transcript has changed since."""
+    cache_path = CHUNKS_CACHE_DIR / f'{video_id}.pkl'
+    if cache_path.exists() and cache_path.stat().st_mtime >= os.path.getmtime(filepath):
+        with open(cache_path, 'rb') as f:
+            return pickle.load(f)
+    return None
+
+def store_cached_chunks(video_id, chunks):
+    CHUNKS_CACHE_DIR.mkdir(exist_ok=True)
+    tmp_path = CHUNKS_CACHE_DIR / f'{video_id}.pkl.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(chunks, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, CHUNKS_CACHE_DIR / f'{video_id}.pkl')
+
+def parse_and_chunk(filepath):
+    """Parse a JSON3 file and chunk it; top-level so it can run in a worker process."""
+    video_id = Path(filepath).stem.replace('.en', '')
+    chunks = load_cached_chunks(filepath, video_id)
+    if chunks is not None:
+        return video_id, chunks
     video_id, segments = parse_json3_file(filepath)
     if not segments:
         return video_id, []
-
     chunks = combine_into_chunks(segments, chunk_ms=180000)
+    store_cached_chunks(video_id, chunks)
+    return video_id, chunks
+
+async def queue_parses(pool, filepaths, parsed):
+    """Start parsing upcoming videos in `pool`; the bounded queue caps how far ahead it runs."""
+    loop = asyncio.get_running_loop()
+    for filepath in filepaths:
+        await parsed.put(loop.run_in_executor(pool, parse_and_chunk, filepath))
 
+async def process_video(session, video_id, chunks, semaphore):
     illustrations = []
-    for i in range(0, len(chunks), 3):
-        batch = chunks[i:i+3]
-        tasks = [analyze_chunk(c['text'], semaphore) for c in batch]
-        results = await asyncio.gather(*tasks)
-
-        for chunk, chunk_results in zip(batch, results):
-            if not chunk_results:
-                continue
-            for ill in chunk_results:
-                if not isinstance(ill, dict):
+    # CHUNKS_PER_REQUEST chunks per request, up to three requests at a time
+    window = 3 * CHUNKS_PER_REQUEST
+    for i in range(0, len(chunks), window):
+        batches = [chunks[j:j + CHUNKS_PER_REQUEST] for j in range(i, min(i + window, len(chunks)), CHUNKS_PER_REQUEST)]
+        results = await asyncio.gather(*[analyze_chunks(session, b, semaphore) for b in batches])
+
+        for batch, batch_results in zip(batches, results):
+            for chunk, chunk_results in zip(batch, batch_results):
+                if not chunk_results:
                     continue
-                opening = ill.get('opening_phrase', '')
-                start_ms = find_timestamp_for_phrase(chunk, opening)
-                ill['timestamp'] = format_timestamp(start_ms)
-                ill['video_url'] = f"https://www.youtube.com/watch?v={video_id}&t={start_ms // 1000}s"
-                ill['video_id'] = video_id
-                if 'opening_phrase' in ill:
-                    del ill['opening_phrase']
-                illustrations.append(ill)
-
-        await asyncio.sleep(0.3)
-
-    return video_id, illustrations
+                for ill in chunk_results:
+                    if not isinstance(ill, dict):
+                        continue
+                    opening = ill.get('opening_phrase', '')
+                    start_ms = find_timestamp_for_phrase(chunk, opening)
+                    ill['timestamp'] = format_timestamp(start_ms)
+                    ill['video_url'] = f"https://www.youtube.com/watch?v={video_id}&t={start_ms // 1000}s"
+                    ill['video_id'] = video_id
+                    if 'opening_phrase' in ill:
+                        del ill['opening_phrase']
+                    illustrations.append(ill)
+
+    return illustrations
+
+def write_json_array(path, items):
+    """Write `items` as a JSON array one record at a time, never building the whole document."""
+    with open(path, 'wb') as f:
+        f.write(b'[\n')
+        for n, item in enumerate(items):
+            if n:
+                f.write(b',\n')
+            f.write(orjson.dumps(item, option=orjson.OPT_INDENT_2))
+        f.write(b'\n]\n')
 
 async def main():
     if not XAI_API_KEY:
@@ -227,6 +383,7 @@ async def main():
         sys.exit(1)
 
     progress = load_progress()
+    load_chunk_cache()
     processed_videos = set(progress.get('processed_videos', []))
     all_illustrations = progress.get('illustrations', [])
 
@@ -239,38 +396,44 @@ async def main():
             all_files.extend(files)
             print(f"Found {len(files)} files in {dir_path}")
 
-    remaining = [f for f in all_files if Path(f).stem.replace('.en', '') not in processed_videos]
+    remaining = [f for f in all_files if f.stem.replace('.en', '') not in processed_videos]
     print(f"Total files: {len(all_files)}, Remaining: {len(remaining)}")
 
     if not remaining:
         print("All videos processed!")
     else:
-        semaphore = asyncio.Semaphore(3)
-
-        for i, filepath in enumerate(remaining):
-            video_id = Path(filepath).stem.replace('.en', '')
-            print(f"\n[{i+1}/{len(remaining)}] Processing {video_id}...")
-
-            video_id, illustrations = await process_video(filepath, semaphore)
-
-            if illustrations:
-                print(f"  Found {len(illustrations)} illustrations")
-                all_illustrations.extend(illustrations)
-            else:
-                print(f"  No illustrations found")
-
-            processed_videos.add(video_id)
-            progress['processed_videos'] = list(processed_videos)
-            progress['illustrations'] = all_illustrations
+        concurrency = 3
+        semaphore = asyncio.Semaphore(concurrency)
+
+        # One pooled keep-alive session for every x.ai call; pool size matches the semaphore
+        connector = aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=75)
+        # Transcripts are parsed in worker processes, a few videos ahead of the API calls
+        with ProcessPoolExecutor() as pool:
+            parsed = asyncio.Queue(maxsize=4)
+            producer = asyncio.create_task(queue_parses(pool, remaining, parsed))
+            async with aiohttp.ClientSession(connector=connector) as session:
+                for i, filepath in enumerate(remaining):
+                    video_id = filepath.stem.replace('.en', '')
+                    print(f"\n[{i+1}/{len(remaining)}] Processing {video_id}...")
+
+                    video_id, chunks = await (await parsed.get())
+                    illustrations = await process_video(session, video_id, chunks, semaphore)
+
+                    if illustrations:
+                        print(f"  Found {len(illustrations)} illustrations")
+                        all_illustrations.extend(illustrations)
+                    else:
+                        print(f"  No illustrations found")
 
-            if (i + 1) % 5 == 0:
-                save_progress(progress)
-                print(f"  [Progress saved: {len(all_illustrations)} total illustrations]")
+                    processed_videos.add(video_id)
+                    append_progress(video_id, illustrations)
+            await producer
 
+        progress['processed_videos'] = list(processed_videos)
+        progress['illustrations'] = all_illustrations
         save_progress(progress)
 
-    with open(OUTPUT_FILE, 'w') as f:
-        json.dump(all_illustrations, f, indent=2)
+    write_json_array(OUTPUT_FILE, all_illustrations)
 
     print(f"\n{'='*50}")
     print(f"TOTAL: {len(all_illustrations)} illustrations from {len(processed_videos)} videos")
@@ -15,18 +15,31 @@ Usage:
 """
 
 import os
+import pickle
 import sys
 import json
 import re
 import asyncio
 import hashlib
 import aiohttp
+import ahocorasick
+import orjson
+from aiolimiter import AsyncLimiter
+try:
+    import ijson
+except ImportError:
+    ijson = None
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
 
 load_dotenv()
 
 XAI_API_KEY = os.environ.get('XAI_API_KEY')
+
+# Client-side pacing keeps requests under the x.ai quota instead of reacting to 429s
+XAI_RPS = float(os.environ.get('XAI_RPS', '8'))
+LIMITER = AsyncLimiter(max_rate=XAI_RPS, time_period=1)
 CHROMA_API_KEY = os.environ.get('CHROMA_API_KEY', 'ck-Ci7fQVMx8Q6nENxr8daGNYYNj22wmTazd9hXkAPWNVPd')
 CHROMA_TENANT = os.environ.get('CHROMA_TENANT', '4b12a7c7-2fb4-4edc-9b6e-c2a77305136b')
 CHROMA_DATABASE = os.environ.get('CHROMA_DATABASE', 'APB')
@@ -38,8 +51,22 @@ JSON3_DIRS = [
 BATCH5_DIR = '/Users/valorkopeny/Desktop/SERMONS_ZIP_05'
 
 PROGRESS_FILE = './illustrations_v4_progress.json'
+PROGRESS_LOG = './illustrations_v4_progress.jsonl'  # one line per finished video, append-only
+CHUNK_CACHE_FILE = './illustrations_v4_chunk_cache.jsonl'  # chunk text hash -> illustrations, append-only
+CHUNKS_CACHE_DIR = Path('./.chunks_cache_v4')  # chunked transcripts of videos not yet finished
 OUTPUT_FILE = './illustrations_v4_all.json'
 
+# Caption events that carry no sermon text
+_SKIP_TEXTS = frozenset(('[Music]', '[Applause]', '\n', ''))
+
+# Markdown fences the model sometimes wraps its JSON in
+_FENCE_OPEN = re.compile(r'^```json?\n?')
+_FENCE_CLOSE = re.compile(r'\n?```$')
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+')
+
+# Chunks sent together in one Grok request
+CHUNKS_PER_REQUEST = 4
+
 EXTRACTION_PROMPT = """You are analyzing a sermon transcript from Pastor Bob Kopeny of Calvary Chapel.
 
 Your job: find STORIES and ANECDOTES — real narratives Pastor Bob tells to illustrate a point. These are the moments listeners remember most.
@@ -74,7 +101,7 @@ CRITICAL RULES:
   BAD: "faith", "life", "God", "salvation" (too generic)
   GOOD: "false teaching", "protecting young believers", "sharing faith with atheists", "dealing with grief after loss"
 
-Transcript segment (video: {video_id}, starting at ~{start_time}):
+Transcript chunks (video: {video_id}; each CHUNK header gives its start time):
 ---
 {text}
 ---
@@ -89,31 +116,39 @@ For EACH illustration found, return:
   "opening_phrase": "The exact first few words where the story begins"
 }}
 
-Return ONLY a JSON array. If no real stories found, return [].
+Return ONLY a JSON array of arrays, one inner array per CHUNK in order (e.g. [[...], [], [...]]).
+Use [] for a chunk with no real stories.
 Be VERY STRICT. Only NARRATIVES with characters and events. NOT teaching points."""
 
 
-def parse_json3_file(filepath):
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-    except Exception:
-        return None, None
+def iter_json3_events(filepath):
+    """Stream transcript events one at a time (ijson), or parse the file whole with orjson."""
+    with open(filepath, 'rb') as f:
+        if ijson is not None:
+            yield from ijson.items(f, 'events.item', use_float=True)
+        else:
+            yield from orjson.loads(f.read()).get('events', [])
 
+
+def parse_json3_file(filepath):
     video_id = Path(filepath).stem.replace('.en', '')
-    events = data.get('events', [])
 
     segments = []
-    for event in events:
-        if 'segs' in event:
-            start_ms = event.get('tStartMs', 0)
-            text_parts = []
-            for seg in event['segs']:
-                if 'utf8' in seg:
-                    text_parts.append(seg['utf8'])
-            text = ''.join(text_parts).strip()
-            if text and text not in ['[Music]', '[Applause]', '\n']:
-                segments.append({'start_ms': start_ms, 'text': text})
+    try:
+        for event in iter_json3_events(filepath):
+            if 'segs' in event:
+                start_ms = event.get('tStartMs', 0)
+                text_parts = []
+                for seg in event['segs']:
+                    if 'utf8' in seg:
+                        text_parts.append(seg['utf8'])
+                if not text_parts:
+                    continue
+                text = ''.join(text_parts).strip()
+                if text not in _SKIP_TEXTS:
+                    segments.append({'start_ms': start_ms, 'text': text})
+    except Exception:
+        return None, None
 
     return video_id, segments
 
@@ -128,12 +163,19 @@ def parse_batch5_sermon(sermon):
     if not transcript or len(transcript) < 200:
         return None, None
 
+    # Slice every 50 sentences straight out of the transcript instead of splitting it into sentences
+    pieces = []
+    start = 0
+    chunk_size = 50
+    for n, boundary in enumerate(_SENTENCE_SPLIT.finditer(transcript), 1):
+        if n % chunk_size == 0:
+            pieces.append(transcript[start:boundary.start()])
+            start = boundary.end()
+    pieces.append(transcript[start:])
+
     segments = []
-    sentences = re.split(r'(?<=[.!?])\s+', transcript)
     current_ms = 0
-    chunk_size = 50
-    for i in range(0, len(sentences), chunk_size):
-        chunk_text = ' '.join(sentences[i:i+chunk_size])
+    for chunk_text in pieces:
         if chunk_text.strip():
             segments.append({'start_ms': current_ms, 'text': chunk_text})
             current_ms += 180000
@@ -163,7 +205,7 @@ def combine_into_chunks(segments, chunk_ms=180000):
             chunks.append(current)
             current = {'start_ms': seg['start_ms'], 'texts': [], 'seg_times': []}
         current['texts'].append(seg['text'])
-        current['seg_times'].append({'ms': seg['start_ms'], 'text': seg['text']})
+        current['seg_times'].append({'ms': seg['start_ms'], 'text': seg['text'], 'text_lower': seg['text'].lower()})
 
     if current['texts']:
         current['text'] = ' '.join(current['texts'])
@@ -177,86 +219,158 @@ def find_timestamp_for_phrase(chunk, phrase):
         return chunk['start_ms']
     phrase_lower = phrase.lower()[:50]
     for seg in chunk['seg_times']:
-        if phrase_lower in seg['text'].lower():
+        if phrase_lower in seg['text_lower']:
             return seg['ms']
+    words = [w for w in phrase_lower.split()[:4] if len(w) > 3]
     for seg in chunk['seg_times']:
-        words = phrase_lower.split()[:4]
-        if all(w in seg['text'].lower() for w in words if len(w) > 3):
+        if all(w in seg['text_lower'] for w in words):
             return seg['ms']
     return chunk['start_ms']
 
 
-def is_worship_or_announcement(text):
-    text_lower = text.lower()
-    worship_phrases = [
-        'let\'s worship', 'let\'s sing', 'worship team', 'praise team',
-        'la la la', 'hallelujah hallelujah', 'glory glory',
-        'this sunday', 'next week', 'sign up', 'registration',
-        'potluck', 'women\'s ministry', 'men\'s breakfast',
-        'welcome to calvary', 'glad you\'re here', 'welcome back'
-    ]
-    worship_count = sum(1 for p in worship_phrases if p in text_lower)
-    if worship_count >= 2:
-        return True
-    music_count = text_lower.count('[music]') + text_lower.count('[applause]')
-    if music_count > 5:
-        return True
-    return False
+WORSHIP_PHRASES = (
+    'let\'s worship', 'let\'s sing', 'worship team', 'praise team',
+    'la la la', 'hallelujah hallelujah', 'glory glory',
+    'this sunday', 'next week', 'sign up', 'registration',
+    'potluck', 'women\'s ministry', 'men\'s breakfast',
+    'welcome to calvary', 'glad you\'re here', 'welcome back'
+)
+NOISE_TAGS = ('[music]', '[applause]')
 
+_WORSHIP_AUTOMATON = ahocorasick.Automaton()
+for _phrase in WORSHIP_PHRASES + NOISE_TAGS:
+    _WORSHIP_AUTOMATON.add_word(_phrase, _phrase)
+_WORSHIP_AUTOMATON.make_automaton()
+
+
+def is_worship_or_announcement(text):
+    # One pass over the text for every phrase and tag
+    phrases_seen = set()
+    noise_count = 0
+    for _, found in _WORSHIP_AUTOMATON.iter(text.lower()):
+        if found in NOISE_TAGS:
+            noise_count += 1
+        else:
+            phrases_seen.add(found)
+    return len(phrases_seen) >= 2 or noise_count > 5
+
+
+def format_chunks(chunks):
+    return '\n\n'.join(
+        f"CHUNK {n} (starting at ~{format_timestamp(c['start_ms'])}):\n{c['text'][:4000]}"
+        for n, c in enumerate(chunks, 1)
+    )
+
+
+def split_per_chunk(result, n):
+    """Model output -> one illustration list per chunk (None where missing), or None if not an array of arrays."""
+    if not isinstance(result, list):
+        return None
+    if not all(isinstance(r, list) for r in result):
+        if n == 1:
+            return [result]  # a single chunk answered with a flat array
+        return None  # can't tell which chunk a flat array belongs to
+    per_chunk = result[:n]
+    return per_chunk + [None] * (n - len(per_chunk))
 
-async def analyze_chunk(chunk_text, video_id, start_time, semaphore, retry=0):
-    if is_worship_or_announcement(chunk_text):
-        return []
 
+async def request_chunks(session, chunks, video_id, semaphore, retry=0):
+    """One Grok request covering several chunks; one illustration list per chunk, or None on failure."""
     async with semaphore:
         try:
             prompt = EXTRACTION_PROMPT.format(
-                text=chunk_text[:4000],
-                video_id=video_id,
-                start_time=start_time
+                text=format_chunks(chunks),
+                video_id=video_id
             )
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    'https://api.x.ai/v1/chat/completions',
-                    headers={
-                        'Content-Type': 'application/json',
-                        'Authorization': f'Bearer {XAI_API_KEY}'
-                    },
-                    json={
-                        'model': 'grok-3-mini-fast',
-                        'messages': [{'role': 'user', 'content': prompt}],
-                        'temperature': 0.15,
-                        'max_tokens': 3000
-                    },
-                    timeout=aiohttp.ClientTimeout(total=60)
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        content = data['choices'][0]['message']['content'].strip()
-                        if content.startswith('```'):
-                            content = re.sub(r'^```json?\n?', '', content)
-                            content = re.sub(r'\n?```$', '', content)
-                        result = json.loads(content)
-                        if isinstance(result, list):
-                            return result
-                        return []
-                    elif response.status == 429:
-                        wait = min(2 ** retry * 2, 30)
-                        print(f"    Rate limited, waiting {wait}s...")
-                        await asyncio.sleep(wait)
-                        if retry < 5:
-                            return await analyze_chunk(chunk_text, video_id, start_time, semaphore, retry + 1)
-                    else:
-                        err = await response.text()
-                        print(f"    API error {response.status}: {err[:100]}")
-        except json.JSONDecodeError as e:
+            await LIMITER.acquire()
+            async with session.post(
+                'https://api.x.ai/v1/chat/completions',
+                headers={
+                    'Content-Type': 'application/json',
+                    'Authorization': f'Bearer {XAI_API_KEY}'
+                },
+                json={
+                    'model': 'grok-3-mini-fast',
+                    'messages': [{'role': 'user', 'content': prompt}],
+                    'temperature': 0.15,
+                    'max_tokens': 3000 * len(chunks)
+                },
+                timeout=aiohttp.ClientTimeout(total=60 * len(chunks))
+            ) as response:
+                if response.status == 200:
+                    data = orjson.loads(await response.read())
+                    content = data['choices'][0]['message']['content'].strip()
+                    if content.startswith('```'):
+                        content = _FENCE_OPEN.sub('', content)
+                        content = _FENCE_CLOSE.sub('', content)
+                    per_chunk = split_per_chunk(orjson.loads(content), len(chunks))
+                    if per_chunk is None:
+                        print(f"    Unexpected response shape for {len(chunks)} chunks, not caching")
+                    return per_chunk
+                elif response.status == 429:
+                    wait = min(2 ** retry * 2, 30)
+                    print(f"    Rate limited, waiting {wait}s...")
+                    await asyncio.sleep(wait)
+                    if retry < 5:
+                        return await request_chunks(session, chunks, video_id, semaphore, retry + 1)
+                else:
+                    err = await response.text()
+                    print(f"    API error {response.status}: {err[:100]}")
+        except orjson.JSONDecodeError as e:
             print(f"    JSON parse error: {e}")
         except Exception as e:
             if retry < 3:
                 await asyncio.sleep(2)
-                return await analyze_chunk(chunk_text, video_id, start_time, semaphore, retry + 1)
+                return await request_chunks(session, chunks, video_id, semaphore, retry + 1)
             print(f"    Error: {e}")
-    return []
+    return None
+
+
+CHUNK_CACHE = {}  # sha256 of the chunk text sent -> serialized illustration list
+
+
+def chunk_key(chunk):
+    return hashlib.sha256(chunk['text'][:4000].encode()).hexdigest()
+
+
+def load_chunk_cache():
+    if os.path.exists(CHUNK_CACHE_FILE):
+        with open(CHUNK_CACHE_FILE, 'rb') as f:
+            for line in f:
+                try:
+                    entry = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    continue
+                CHUNK_CACHE[entry['key']] = orjson.dumps(entry['illustrations'])
+
+
+def cache_chunk_result(key, illustrations):
+    CHUNK_CACHE[key] = orjson.dumps(illustrations)
+    with open(CHUNK_CACHE_FILE, 'ab') as f:
+        f.write(orjson.dumps({'key': key, 'illustrations': illustrations}) + b'\n')
+
+
+async def analyze_chunks(session, chunks, video_id, semaphore):
+    """One illustration list per chunk; repeated chunk text is served from CHUNK_CACHE."""
+    results = [[] for _ in chunks]
+    pending = []
+    for i, chunk in enumerate(chunks):
+        key = chunk_key(chunk)
+        cached = CHUNK_CACHE.get(key)
+        if cached is None:
+            pending.append((i, key))
+        else:
+            results[i] = orjson.loads(cached)
+
+    if pending:
+        fresh = await request_chunks(session, [chunks[i] for i, _ in pending], video_id, semaphore)
+        if fresh is not None:
+            for (i, key), illustrations in zip(pending, fresh):
+                if illustrations is None:
+                    continue  # model skipped this chunk; leave it uncached for a later run
+                cache_chunk_result(key, illustrations)
+                results[i] = illustrations
+    return results
 
 
 def format_illustration(ill, chunk, video_id):
@@ -287,27 +401,66 @@ def format_illustration(ill, chunk, video_id):
     }
 
 
-async def process_video(video_id, segments, semaphore):
+def load_cached_chunks(filepath, video_id):
+    """Chunks saved by an earlier run, unless the transcript has changed since."""
+    cache_path = CHUNKS_CACHE_DIR / f'{video_id}.pkl'
+    if cache_path.exists() and cache_path.stat().st_mtime >= os.path.getmtime(filepath):
+        with open(cache_path, 'rb') as f:
+            return pickle.load(f)
+    return None
+
+
+def store_cached_chunks(video_id, chunks):
+    CHUNKS_CACHE_DIR.mkdir(exist_ok=True)
+    tmp_path = CHUNKS_CACHE_DIR / f'{video_id}.pkl.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(chunks, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, CHUNKS_CACHE_DIR / f'{video_id}.pkl')
+
+
+def parse_and_chunk(source_type, source_data):
+    """Parse one source and chunk it; top-level so it can run in a worker process."""
+    if source_type == 'json3':
+        video_id = Path(source_data).stem.replace('.en', '')
+        chunks = load_cached_chunks(source_data, video_id)
+        if chunks is not None:
+            return chunks
+        _, segments = parse_json3_file(source_data)
+    else:
+        _, segments = parse_batch5_sermon(json.loads(source_data))
+    if not segments:
+        return []
     chunks = combine_into_chunks(segments, chunk_ms=180000)
-    illustrations = []
+    if source_type == 'json3':
+        store_cached_chunks(video_id, chunks)
+    return chunks
+
 
-    for i in range(0, len(chunks), 3):
-        batch = chunks[i:i+3]
-        tasks = [
-            analyze_chunk(c['text'], video_id, format_timestamp(c['start_ms']), semaphore)
-            for c in batch
-        ]
-        results = await asyncio.gather(*tasks)
+async def queue_parses(pool, sources, parsed):
+    """Start parsing upcoming videos in `pool`; the bounded queue caps how far ahead it runs."""
+    loop = asyncio.get_running_loop()
+    for source_type, source_data, _ in sources:
+        await parsed.put(loop.run_in_executor(pool, parse_and_chunk, source_type, source_data))
 
-        for chunk, chunk_results in zip(batch, results):
-            if not chunk_results:
-                continue
-            for ill in chunk_results:
-                formatted = format_illustration(ill, chunk, video_id)
-                if formatted:
-                    illustrations.append(formatted)
 
-        await asyncio.sleep(0.2)
+async def process_video(session, video_id, chunks, semaphore):
+    chunks = [c for c in chunks if not is_worship_or_announcement(c['text'])]
+    illustrations = []
+
+    # CHUNKS_PER_REQUEST chunks per request, up to three requests at a time
+    window = 3 * CHUNKS_PER_REQUEST
+    for i in range(0, len(chunks), window):
+        batches = [chunks[j:j + CHUNKS_PER_REQUEST] for j in range(i, min(i + window, len(chunks)), CHUNKS_PER_REQUEST)]
+        results = await asyncio.gather(*[analyze_chunks(session, b, video_id, semaphore) for b in batches])
+
+        for batch, batch_results in zip(batches, results):
+            for chunk, chunk_results in zip(batch, batch_results):
+                if not chunk_results:
+                    continue
+                for ill in chunk_results:
+                    formatted = format_illustration(ill, chunk, video_id)
+                    if formatted:
+                        illustrations.append(formatted)
 
     return illustrations
 
@@ -315,8 +468,24 @@ async def process_video(video_id, segments, semaphore):
 def load_progress():
     if os.path.exists(PROGRESS_FILE):
         with open(PROGRESS_FILE, 'r') as f:
-            return json.load(f)
-    return {'processed_videos': [], 'illustrations': [], 'stats': {'total_videos': 0, 'total_illustrations': 0}}
+            progress = json.load(f)
+    else:
+        progress = {'processed_videos': [], 'illustrations': [], 'stats': {'total_videos': 0, 'total_illustrations': 0}}
+
+    # Replay videos finished since the last full save
+    if os.path.exists(PROGRESS_LOG):
+        done = set(progress['processed_videos'])
+        with open(PROGRESS_LOG, 'rb') as f:
+            for line in f:
+                try:
+                    entry = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    continue  # torn write from a crash; that video is simply redone
+                if entry['video_id'] not in done:
+                    done.add(entry['video_id'])
+                    progress['processed_videos'].append(entry['video_id'])
+                    progress['illustrations'].extend(entry['illustrations'])
+    return progress
 
 
 def save_progress(progress):
@@ -326,6 +495,16 @@ def save_progress(progress):
     }
     with open(PROGRESS_FILE, 'w') as f:
         json.dump(progress, f, indent=2)
+    # Everything in the log is now in the full save
+    if os.path.exists(PROGRESS_LOG):
+        os.remove(PROGRESS_LOG)
+
+
+def append_progress(video_id, illustrations):
+    with open(PROGRESS_LOG, 'ab') as f:
+        f.write(orjson.dumps({'video_id': video_id, 'illustrations': illustrations}) + b'\n')
+    # A finished video is never parsed again, so its cached chunks can go
+    (CHUNKS_CACHE_DIR / f'{video_id}.pkl').unlink(missing_ok=True)
 
 
 async def upload_to_chroma(illustrations):
@@ -350,14 +529,20 @@ async def upload_to_chroma(illustrations):
 
         batch_size = 50
         total_uploaded = 0
+        # Batches upload from worker threads, up to four at a time
+        semaphore = asyncio.Semaphore(4)
 
-        for i in range(0, len(illustrations), batch_size):
+        async def _upload(i):
+            nonlocal total_uploaded
             batch = illustrations[i:i+batch_size]
             ids, documents, metadatas = [], [], []
 
             for j, ill in enumerate(batch):
-                doc_id = hashlib.md5(
-                    f"{ill['video_id']}_{ill['illustration_timestamp']}_{i+j}".encode()
+                # Only needs to be unique within the freshly created collection
+                doc_id = hashlib.blake2b(
+                    f"{ill['video_id']}_{ill['illustration_timestamp']}_{i+j}".encode(),
+                    digest_size=16,
+                    usedforsecurity=False
                 ).hexdigest()
                 ids.append(doc_id)
                 documents.append(ill['full_text'])
@@ -371,10 +556,13 @@ async def upload_to_chroma(illustrations):
                     'video_id': ill.get('video_id', '')
                 })
 
-            collection.add(ids=ids, documents=documents, metadatas=metadatas)
+            async with semaphore:
+                await asyncio.to_thread(collection.add, ids=ids, documents=documents, metadatas=metadatas)
             total_uploaded += len(batch)
             print(f"  Uploaded {total_uploaded}/{len(illustrations)}")
 
+        await asyncio.gather(*[_upload(i) for i in range(0, len(illustrations), batch_size)])
+
         print(f"Chroma upload complete: {collection.count()} illustrations in illustrations_v4")
         return True
     except Exception as e:
@@ -382,12 +570,24 @@ async def upload_to_chroma(illustrations):
         return False
 
 
+def write_json_array(path, items):
+    """Write `items` as a JSON array one record at a time, never building the whole document."""
+    with open(path, 'wb') as f:
+        f.write(b'[\n')
+        for n, item in enumerate(items):
+            if n:
+                f.write(b',\n')
+            f.write(orjson.dumps(item, option=orjson.OPT_INDENT_2))
+        f.write(b'\n]\n')
+
+
 async def main():
     if not XAI_API_KEY:
         print("ERROR: XAI_API_KEY not set in .env")
         sys.exit(1)
 
     progress = load_progress()
+    load_chunk_cache()
     processed_videos = set(progress.get('processed_videos', []))
     all_illustrations = progress.get('illustrations', [])
 
@@ -396,6 +596,7 @@ async def main():
 
     all_sources = []
 
+    json3_count = 0
     for dir_path in JSON3_DIRS:
         if os.path.exists(dir_path):
             files = sorted(Path(dir_path).glob('*.json3'))
@@ -403,7 +604,8 @@ async def main():
                 vid = f.stem.replace('.en', '')
                 if vid not in processed_videos:
                     all_sources.append(('json3', str(f), vid))
-            print(f"  {dir_path}: {len(files)} total, {sum(1 for s in all_sources if s[0]=='json3')} remaining")
+                    json3_count += 1
+            print(f"  {dir_path}: {len(files)} total, {json3_count} remaining")
 
     if os.path.exists(BATCH5_DIR):
         batch5_count = 0
@@ -424,44 +626,45 @@ async def main():
     if not all_sources:
         print("All videos processed!")
     else:
-        semaphore = asyncio.Semaphore(3)
-
-        for i, (source_type, source_data, video_id) in enumerate(all_sources):
-            print(f"\n[{i+1}/{len(all_sources)}] Processing {video_id}...")
-
-            if source_type == 'json3':
-                _, segments = parse_json3_file(source_data)
-            else:
-                sermon = json.loads(source_data)
-                _, segments = parse_batch5_sermon(sermon)
-
-            if not segments:
-                print(f"  No segments found, skipping")
-                processed_videos.add(video_id)
-                continue
-
-            illustrations = await process_video(video_id, segments, semaphore)
-
-            if illustrations:
-                print(f"  Found {len(illustrations)} illustrations")
-                for ill in illustrations[:2]:
-                    print(f"    - [{ill['type']}] {ill['summary'][:80]}...")
-                all_illustrations.extend(illustrations)
-            else:
-                print(f"  No illustrations found")
-
-            processed_videos.add(video_id)
-            progress['processed_videos'] = list(processed_videos)
-            progress['illustrations'] = all_illustrations
+        concurrency = 3
+        semaphore = asyncio.Semaphore(concurrency)
+
+        # One pooled keep-alive session for every x.ai call; pool size matches the semaphore
+        connector = aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=75)
+        # Transcripts are parsed in worker processes, a few videos ahead of the API calls
+        with ProcessPoolExecutor() as pool:
+            parsed = asyncio.Queue(maxsize=4)
+            producer = asyncio.create_task(queue_parses(pool, all_sources, parsed))
+            async with aiohttp.ClientSession(connector=connector) as session:
+                for i, (_, _, video_id) in enumerate(all_sources):
+                    print(f"\n[{i+1}/{len(all_sources)}] Processing {video_id}...")
+
+                    chunks = await (await parsed.get())
+                    if not chunks:
+                        print(f"  No segments found, skipping")
+                        processed_videos.add(video_id)
+                        append_progress(video_id, [])
+                        continue
+
+                    illustrations = await process_video(session, video_id, chunks, semaphore)
+
+                    if illustrations:
+                        print(f"  Found {len(illustrations)} illustrations")
+                        for ill in illustrations[:2]:
+                            print(f"    - [{ill['type']}] {ill['summary'][:80]}...")
+                        all_illustrations.extend(illustrations)
+                    else:
+                        print(f"  No illustrations found")
 
-            if (i + 1) % 5 == 0:
-                save_progress(progress)
-                print(f"  [Saved: {len(processed_videos)} videos, {len(all_illustrations)} illustrations]")
+                    processed_videos.add(video_id)
+                    append_progress(video_id, illustrations)
+            await producer
 
+        progress['processed_videos'] = list(processed_videos)
+        progress['illustrations'] = all_illustrations
         save_progress(progress)
 
-    with open(OUTPUT_FILE, 'w') as f:
-        json.dump(all_illustrations, f, indent=2)
+    write_json_array(OUTPUT_FILE, all_illustrations)
 
     print(f"\n{'='*60}")
     print(f"TOTAL: {len(all_illustrations)} illustrations from {len(processed_videos)} videos")
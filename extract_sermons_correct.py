@@ -2,8 +2,20 @@
 """
 Extract sermon data from ChromaDB to a deployable JSON format
 """
-import json
+import os
+import sys
+import struct
 import sqlite3
+import orjson
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# --msgpack writes sermon_data.msgpack, one MessagePack array (msgpack.unpackb(data, raw=False))
+use_msgpack = '--msgpack' in sys.argv
+if use_msgpack and msgpack is None:
+    sys.exit("--msgpack requires the msgpack package (pip install msgpack)")
 
 # Connect to ChromaDB SQLite database
 db_path = "sermon_vector_db/chroma.sqlite3"
@@ -12,7 +24,7 @@ cursor = conn.cursor()
 
 print("Extracting sermon data from ChromaDB...")
 
-# Get documents with metadata
+# Get documents with metadata; SQLite drops short/unlinked segments and does the ordering
 cursor.execute("""
     SELECT 
         efs.string_value as document,
@@ -21,16 +33,29 @@ cursor.execute("""
     FROM embedding_fulltext_search efs
     JOIN embeddings_queue eq ON eq.id = efs.id
     WHERE eq.metadata IS NOT NULL
+        AND json_valid(eq.metadata)
+        AND length(efs.string_value) > 50
+        AND coalesce(json_extract(eq.metadata, '$.video_id'), '') != ''
+    ORDER BY
+        coalesce(json_extract(eq.metadata, '$.sermon_number'), 0),
+        coalesce(json_extract(eq.metadata, '$.start_time'), 0)
     LIMIT 10000
 """)
 
-sermons = []
-for row in cursor.fetchall():
-    document, doc_id, metadata_json = row
-    
-    if document and metadata_json:
+# Entries go straight to disk as rows arrive (compact format to reduce size)
+output_file = "sermon_data.msgpack" if use_msgpack else "sermon_data.json"
+count = 0
+with open(output_file, 'wb') as f:
+    packer = msgpack.Packer(use_bin_type=True) if use_msgpack else None
+    if packer:
+        f.write(b'\xdd\x00\x00\x00\x00')  # array32 header; count patched in below
+    else:
+        f.write(b'[')
+    for row in cursor:  # rows stream from SQLite; no full result list
+        document, doc_id, metadata_json = row
+        
         try:
-            metadata = json.loads(metadata_json)
+            metadata = orjson.loads(metadata_json)
             sermon_entry = {
                 "id": doc_id,
                 "text": document,
@@ -40,24 +65,22 @@ for row in cursor.fetchall():
                 "url": metadata.get("url", ""),
                 "sermon_number": metadata.get("sermon_number", 0)
             }
-            
-            # Only add if it has meaningful content
-            if len(document) > 50 and metadata.get("video_id"):
-                sermons.append(sermon_entry)
         except Exception as e:
             continue
+        if packer:
+            f.write(packer.pack(sermon_entry))
+        else:
+            f.write((b',' if count else b'') + orjson.dumps(sermon_entry))
+        count += 1
+    if packer:
+        f.seek(1)
+        f.write(struct.pack('>I', count))
+    else:
+        f.write(b']')
 
-print(f"Found {len(sermons)} valid sermon segments")
-
-# Sort by sermon number and start time
-sermons.sort(key=lambda x: (x.get("sermon_number", 0), x.get("start_time", 0)))
-
-# Save to JSON (compact format to reduce size)
-output_file = "sermon_data.json"
-with open(output_file, 'w') as f:
-    json.dump(sermons, f, separators=(',', ':'))
+print(f"Found {count} valid sermon segments")
 
-file_size_mb = len(json.dumps(sermons, separators=(',', ':'))) / 1024 / 1024
+file_size_mb = os.path.getsize(output_file) / 1024 / 1024
 print(f"Saved to {output_file} ({file_size_mb:.2f} MB)")
 
 conn.close()
\ No newline at end of file
@@ -3,9 +3,21 @@
 Extract sermon data from ChromaDB to a simple JSON format
 This will create a lightweight, deployable sermon database
 """
-import json
+import os
+import sys
+import struct
 import sqlite3
+import orjson
 import pickle
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# --msgpack writes sermon_data.msgpack, one MessagePack array (msgpack.unpackb(data, raw=False))
+use_msgpack = '--msgpack' in sys.argv
+if use_msgpack and msgpack is None:
+    sys.exit("--msgpack requires the msgpack package (pip install msgpack)")
 
 # Connect to ChromaDB SQLite database
 db_path = "sermon_vector_db/chroma.sqlite3"
@@ -27,33 +39,45 @@ cursor.execute("""
     LIMIT 5000
 """)
 
-sermons = []
-for row in cursor.fetchall():
-    seq_id, operation, metadata_json, document = row
-    
-    if document and metadata_json:
-        try:
-            metadata = json.loads(metadata_json)
-            sermon_entry = {
-                "text": document,
-                "title": metadata.get("title", "Unknown"),
-                "video_id": metadata.get("video_id", ""),
-                "start_time": metadata.get("start_time", 0),
-                "url": metadata.get("url", ""),
-                "sermon_number": metadata.get("sermon_number", 0)
-            }
-            sermons.append(sermon_entry)
-        except:
-            continue
-
-print(f"Found {len(sermons)} sermon segments")
-
-# Save to JSON
-output_file = "sermon_data.json"
-with open(output_file, 'w') as f:
-    json.dump(sermons, f, separators=(',', ':'))
-
-file_size_mb = len(json.dumps(sermons)) / 1024 / 1024
+# Entries go straight to disk as rows arrive
+output_file = "sermon_data.msgpack" if use_msgpack else "sermon_data.json"
+count = 0
+with open(output_file, 'wb') as f:
+    packer = msgpack.Packer(use_bin_type=True) if use_msgpack else None
+    if packer:
+        f.write(b'\xdd\x00\x00\x00\x00')  # array32 header; count patched in below
+    else:
+        f.write(b'[')
+    for row in cursor:  # rows stream from SQLite; no full result list
+        seq_id, operation, metadata_json, document = row
+        
+        if document and metadata_json:
+            try:
+                metadata = orjson.loads(metadata_json)
+                sermon_entry = {
+                    "text": document,
+                    "title": metadata.get("title", "Unknown"),
+                    "video_id": metadata.get("video_id", ""),
+                    "start_time": metadata.get("start_time", 0),
+                    "url": metadata.get("url", ""),
+                    "sermon_number": metadata.get("sermon_number", 0)
+                }
+            except:
+                continue
+            if packer:
+                f.write(packer.pack(sermon_entry))
+            else:
+                f.write((b',' if count else b'') + orjson.dumps(sermon_entry))
+            count += 1
+    if packer:
+        f.seek(1)
+        f.write(struct.pack('>I', count))
+    else:
+        f.write(b']')
+
+print(f"Found {count} sermon segments")
+
+file_size_mb = os.path.getsize(output_file) / 1024 / 1024
 print(f"Saved to {output_file} ({file_size_mb:.2f} MB)")
 
 conn.close()
\ No newline at end of file
@@ -2,8 +2,20 @@
 """
 Fetch all sermon data from the running API and save to JSON
 """
+import os
+import sys
 import requests
-import json
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# --msgpack saves sermons_static.msgpack (msgpack.unpackb(data, raw=False)) instead of JSON
+use_msgpack = '--msgpack' in sys.argv
+if use_msgpack and msgpack is None:
+    sys.exit("--msgpack requires the msgpack package (pip install msgpack)")
 
 # Topics to search for
 topics = [
@@ -19,43 +31,55 @@ all_sermons = {}  # Use dict to avoid duplicates
 
 print("Fetching sermon data from API...")
 
-for topic in topics:
-    print(f"Fetching {topic}...")
-    try:
-        response = requests.post(
-            "http://localhost:5001/api/sermon/search",
-            json={"query": topic, "n_results": 50}
-        )
-        data = response.json()
+def fetch_topic(session, topic):
+    return session.post(
+        "http://localhost:5001/api/sermon/search",
+        json={"query": topic, "n_results": 50}
+    )
+
+# Requests run concurrently over one keep-alive session; results are merged
+# in topic order so the output matches a sequential run
+with requests.Session() as session, ThreadPoolExecutor(max_workers=8) as executor:
+    futures = [executor.submit(fetch_topic, session, topic) for topic in topics]
+    for topic, future in zip(topics, futures):
+        print(f"Fetching {topic}...")
+        try:
+            response = future.result()
+            data = orjson.loads(response.content)
         
-        for result in data.get("results", []):
-            # Create unique key
-            key = f"{result['video_id']}_{result['start_time']}"
+            for result in data.get("results", []):
+                # Create unique key
+                key = f"{result['video_id']}_{result['start_time']}"
             
-            # Store sermon data
-            if key not in all_sermons:
-                all_sermons[key] = {
-                    "text": result["text"],
-                    "title": result["title"],
-                    "video_id": result["video_id"],
-                    "start_time": result["start_time"],
-                    "url": result["url"],
-                    "topics": [topic]
-                }
-            else:
-                # Add topic if not already there
-                if topic not in all_sermons[key]["topics"]:
-                    all_sermons[key]["topics"].append(topic)
-    except Exception as e:
-        print(f"Error fetching {topic}: {e}")
+                # Store sermon data
+                if key not in all_sermons:
+                    all_sermons[key] = {
+                        "text": result["text"],
+                        "title": result["title"],
+                        "video_id": result["video_id"],
+                        "start_time": result["start_time"],
+                        "url": result["url"],
+                        "topics": {topic: None}  # insertion-ordered set
+                    }
+                else:
+                    # Add topic if not already there (hashed, keeps first-seen order)
+                    all_sermons[key]["topics"].setdefault(topic)
+        except Exception as e:
+            print(f"Error fetching {topic}: {e}")
 
 # Convert to list
 sermon_list = list(all_sermons.values())
+for sermon in sermon_list:
+    sermon["topics"] = list(sermon["topics"])
 print(f"\nTotal unique sermon segments: {len(sermon_list)}")
 
-# Save to JSON
-with open("sermons_static.json", "w") as f:
-    json.dump(sermon_list, f, separators=(',', ':'))
+# Save to JSON (or MessagePack)
+output_file = "sermons_static.msgpack" if use_msgpack else "sermons_static.json"
+with open(output_file, "wb") as f:
+    if use_msgpack:
+        f.write(msgpack.packb(sermon_list, use_bin_type=True))
+    else:
+        f.write(orjson.dumps(sermon_list))
 
-file_size_mb = len(json.dumps(sermon_list, separators=(',', ':'))) / 1024 / 1024
-print(f"Saved to sermons_static.json ({file_size_mb:.2f} MB)")
\ No newline at end of file
+file_size_mb = os.path.getsize(output_file) / 1024 / 1024
+print(f"Saved to {output_file} ({file_size_mb:.2f} MB)")
\ No newline at end of file
@@ -7,6 +7,8 @@ Step 2: Import to Cloud
 
 import os
 import json
+import mmap
+import orjson
 import chromadb
 from chromadb.config import Settings
 from dotenv import load_dotenv
@@ -16,6 +18,7 @@ load_dotenv()
 CHROMA_API_KEY = os.environ.get('CHROMA_API_KEY')
 LOCAL_DB_PATH = './sermon_vector_db'
 EXPORT_FILE = './sermon_export.json'
+NDJSON_EXPORT_FILE = './sermon_export.ndjson'  # written by export_sqlite_to_json.py
 BATCH_SIZE = 100
 
 def export_local():
@@ -75,8 +78,18 @@ def export_local():
 def import_to_cloud():
     """Import from JSON file to Chroma Cloud"""
     print("\nLoading export file...")
-    with open(EXPORT_FILE, 'r') as f:
-        all_data = json.load(f)
+    if os.path.exists(EXPORT_FILE):
+        # Parse straight from the mapped file: no intermediate str copy of the export
+        with open(EXPORT_FILE, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with memoryview(mm) as view:
+                all_data = orjson.loads(view)
+    else:
+        with open(NDJSON_EXPORT_FILE, 'rb') as f:
+            all_data = [orjson.loads(line) for line in f if line.strip()]
+        # The production collection must get the original vectors, not int8 round-trips
+        if any('embedding_offset' in item for item in all_data):
+            raise SystemExit(f"{NDJSON_EXPORT_FILE} has int8 embeddings; re-run "
+                             "export_sqlite_to_json.py without --int8-embeddings")
     
     print(f"Loaded {len(all_data)} segments")
     
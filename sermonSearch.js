@@ -6,9 +6,18 @@
 const fs = require('fs');
 const path = require('path');
 
+const SEARCH_CACHE_SIZE = 512;
+
 class SermonSearch {
   constructor() {
     this.sermons = [];
+    this.tokenIndex = new Map();
+    this.topicIndex = new Map();
+    this.vocabText = '';
+    this.vocabStarts = new Int32Array(0);
+    this.vocabPostings = [];
+    this.timestampedUrls = [];
+    this.searchCache = new Map();
     this.loadSermons();
   }
 
@@ -17,11 +26,77 @@ class SermonSearch {
       const dataPath = path.join(__dirname, 'sermons_static.json');
       const data = fs.readFileSync(dataPath, 'utf8');
       this.sermons = JSON.parse(data);
+      this.buildIndex();
       console.log(`Loaded ${this.sermons.length} sermon segments`);
     } catch (error) {
       console.error('Failed to load sermon data:', error);
       this.sermons = [];
+      this.buildIndex();
+    }
+  }
+
+  /**
+   * Build token -> sermon and topic -> sermon posting lists once at load.
+   * Query words never contain whitespace, so any substring hit lies inside
+   * a single whitespace-delimited token of the text.
+   */
+  buildIndex() {
+    this.searchCache = new Map();
+    this.tokenIndex = new Map();
+    this.topicIndex = new Map();
+    // start_time and url never change after load, so build the deep links once
+    this.timestampedUrls = this.sermons.map(sermon =>
+      `${sermon.url}&t=${this.timeToSeconds(String(sermon.start_time ?? ''))}s`
+    );
+    this.sermons.forEach((sermon, i) => {
+      for (const token of (sermon.text || '').toLowerCase().split(/\s+/)) {
+        if (token.length < 4) continue;
+        let postings = this.tokenIndex.get(token);
+        if (!postings) this.tokenIndex.set(token, postings = new Set());
+        postings.add(i);
+      }
+      for (const topic of sermon.topics || []) {
+        const key = topic.toLowerCase();
+        let postings = this.topicIndex.get(key);
+        if (!postings) this.topicIndex.set(key, postings = new Set());
+        postings.add(i);
+      }
+    });
+
+    // Flatten the vocabulary into one newline-separated string plus start
+    // offsets so postingsFor can scan it with native indexOf
+    const vocab = [...this.tokenIndex.keys()];
+    this.vocabPostings = vocab.map(token => [...this.tokenIndex.get(token)]);
+    this.vocabText = vocab.join('\n');
+    this.vocabStarts = new Int32Array(vocab.length);
+    let offset = 0;
+    vocab.forEach((token, id) => {
+      this.vocabStarts[id] = offset;
+      offset += token.length + 1;
+    });
+  }
+
+  /**
+   * Sermon indices whose text contains word (same as textLower.includes(word))
+   */
+  postingsFor(word) {
+    const hits = new Set();
+    const starts = this.vocabStarts;
+    let pos = this.vocabText.indexOf(word);
+    while (pos !== -1) {
+      // Binary search for the token containing pos (word has no '\n', so it cannot span tokens)
+      let lo = 0;
+      let hi = starts.length - 1;
+      while (lo < hi) {
+        const mid = (lo + hi + 1) >> 1;
+        if (starts[mid] <= pos) lo = mid;
+        else hi = mid - 1;
+      }
+      for (const i of this.vocabPostings[lo]) hits.add(i);
+      if (lo + 1 >= starts.length) break;
+      pos = this.vocabText.indexOf(word, starts[lo + 1]);
     }
+    return hits;
   }
 
   /**
@@ -57,36 +132,77 @@ class SermonSearch {
       return [];
     }
 
-    // Score all sermons
-    const scored = this.sermons.map(sermon => {
-      const score = this.calculateRelevance(
-        query, 
-        sermon.text, 
-        sermon.topics || []
-      );
-      
-      return {
-        ...sermon,
-        relevance_score: score
-      };
-    });
+    // Scores depend only on the lowercased query, so repeated utterances reuse
+    // the last result (Map insertion order doubles as LRU order)
+    const queryLower = query.toLowerCase();
+    const cacheKey = `${nResults}\u0000${queryLower}`;
+    let results = this.searchCache.get(cacheKey);
+    if (results) {
+      this.searchCache.delete(cacheKey);
+    } else {
+      results = this.rankSermons(queryLower, nResults);
+    }
+    this.searchCache.set(cacheKey, results);
+    if (this.searchCache.size > SEARCH_CACHE_SIZE) {
+      this.searchCache.delete(this.searchCache.keys().next().value);
+    }
+    return results.map(r => ({ ...r }));
+  }
+
+  /**
+   * Score, filter and format sermons for an already lowercased query
+   */
+  rankSermons(queryLower, nResults) {
+    // Score only sermons reachable from the index (same scores as calculateRelevance)
+    const queryWords = queryLower.split(/\s+/);
+    const wordMatches = new Map();
+    const postingsCache = new Map();
+    for (const word of queryWords) {
+      if (word.length <= 3) continue;
+      if (!postingsCache.has(word)) postingsCache.set(word, this.postingsFor(word));
+      for (const i of postingsCache.get(word)) {
+        wordMatches.set(i, (wordMatches.get(i) || 0) + 1);
+      }
+    }
+    const topicHits = new Set();
+    for (const [topic, postings] of this.topicIndex) {
+      if (queryLower.includes(topic)) {
+        for (const i of postings) topicHits.add(i);
+      }
+    }
 
-    // Filter and sort by relevance
-    const relevant = scored
-      .filter(s => s.relevance_score > 0.2)
-      .sort((a, b) => b.relevance_score - a.relevance_score)
-      .slice(0, nResults);
+    // Bounded top-k selection instead of scoring objects and sorting every candidate;
+    // candidates are visited in load order so ties keep the old stable-sort order
+    const limit = Number.isFinite(nResults) && nResults >= 0 ? Math.floor(nResults) : Infinity;
+    if (limit === 0) return [];
+    const candidates = [...new Set([...wordMatches.keys(), ...topicHits])].sort((a, b) => a - b);
+    const top = [];
+    for (const i of candidates) {
+      const wordScore = (wordMatches.get(i) || 0) / queryWords.length;
+      const topicScore = topicHits.has(i) ? 0.3 : 0;
+      const score = Math.min(1.0, wordScore + topicScore);
+      if (!(score > 0.2)) continue;
+      if (top.length === limit && top[limit - 1].relevance_score >= score) continue;
+      let pos = top.length;
+      while (pos > 0 && top[pos - 1].relevance_score < score) pos--;
+      top.splice(pos, 0, { i, relevance_score: score });
+      if (top.length > limit) top.pop();
+    }
+    const relevant = top.slice(0, nResults);
 
     // Format results
-    return relevant.map(sermon => ({
-      text: sermon.text,
-      title: sermon.title,
-      video_id: sermon.video_id,
-      start_time: sermon.start_time,
-      url: sermon.url,
-      relevance_score: sermon.relevance_score,
-      timestamped_url: `${sermon.url}&t=${this.timeToSeconds(sermon.start_time)}s`
-    }));
+    return relevant.map(({ i, relevance_score }) => {
+      const sermon = this.sermons[i];
+      return {
+        text: sermon.text,
+        title: sermon.title,
+        video_id: sermon.video_id,
+        start_time: sermon.start_time,
+        url: sermon.url,
+        relevance_score,
+        timestamped_url: this.timestampedUrls[i]
+      };
+    });
   }
 
   /**
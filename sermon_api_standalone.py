@@ -4,6 +4,7 @@ Simplified version for cloud deployment
 """
 import os
 import json
+import heapq
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import numpy as np
@@ -49,9 +50,8 @@ def search_sermons_direct(query, n_results=3):
             
             results.append((row_id, similarity))
         
-        # Sort by similarity and get top results
-        results.sort(key=lambda x: x[1], reverse=True)
-        top_ids = [r[0] for r in results[:n_results]]
+        # Keep only the top results (bounded heap instead of sorting every row)
+        top_ids = [r[0] for r in heapq.nlargest(n_results, results, key=lambda x: x[1])]
         
         # Get metadata for top results
         final_results = []
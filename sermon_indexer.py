@@ -28,6 +28,17 @@ try:
 except LookupError:
     nltk.download('punkt')
 
+# Classification patterns, checked in order; each is one alternation of literal phrases
+SEGMENT_TYPE_PATTERNS = tuple(
+    (segment_type, re.compile('|'.join(map(re.escape, phrases))))
+    for segment_type, phrases in (
+        ("illustration", ['let me tell you a story', 'i remember when', 'there was a', 'once upon']),
+        ("scripture", ['turn to', 'scripture says', 'the bible says', 'verse', 'chapter']),
+        ("prayer", ['let us pray', 'father god', 'lord we', 'amen']),
+        ("teaching", ['what does this mean', 'the point is', 'god is telling us']),
+    )
+)
+
 @dataclass
 class SermonSegment:
     """Represents a segment of a sermon with timestamp and content"""
@@ -141,17 +152,11 @@ class SermonIndexer:
         """Classify the type of content in a segment"""
         text_lower = text.lower()
         
-        # Classification patterns
-        if any(phrase in text_lower for phrase in ['let me tell you a story', 'i remember when', 'there was a', 'once upon']):
-            return "illustration"
-        elif any(phrase in text_lower for phrase in ['turn to', 'scripture says', 'the bible says', 'verse', 'chapter']):
-            return "scripture"
-        elif any(phrase in text_lower for phrase in ['let us pray', 'father god', 'lord we', 'amen']):
-            return "prayer"
-        elif any(phrase in text_lower for phrase in ['what does this mean', 'the point is', 'god is telling us']):
-            return "teaching"
-        else:
-            return "general"
+        # First matching category wins (one regex pass per category)
+        for segment_type, pattern in SEGMENT_TYPE_PATTERNS:
+            if pattern.search(text_lower):
+                return segment_type
+        return "general"
     
     def extract_scripture_references(self, text: str) -> List[str]:
         """Extract scripture references from text"""
@@ -26,7 +26,7 @@ RERANKER_PID=$!
 # Start ChromaDB API on its own port
 echo "Starting ChromaDB API on port $CHROMADB_PORT..."
 cd chromadb_api
-PORT=$CHROMADB_PORT python app.py &
+PORT=$CHROMADB_PORT gunicorn app:application -c gunicorn_conf.py &
 CHROMADB_PID=$!
 cd ..
 